@@ -0,0 +1,82 @@
+"""Compare compressing the cached pages once per data version with compressing them on every request.
+
+An in-process server with a synthetic database serves the front page, the
+past talks and the upcoming talks iframe with each content coding. In the
+`cached` mode the compressed bytes are kept in the page cache, as in
+production, in the `per-request` mode they are dropped after every
+response, as a compressing proxy or `tools.gzip` would do. For each
+combination the bytes on the wire, the throughput and the CPU time of the
+process per request are printed (the client runs in the same process, so
+compare against the identity row rather than read the numbers as absolute).
+
+Run as `python benchmarks/compression.py CONFIG_SQLITE`."""
+
+import argparse
+import http.client
+import os.path
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from synthetic import make_database
+from loadtest import drive, free_port, percentile
+
+ENDPOINTS = ['/', '/past/', '/iframeupcoming']
+
+def wire_bytes(port, url, encoding):
+    c = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    c.request('GET', url, headers={'Accept-Encoding': encoding} if encoding else {})
+    r = c.getresponse()
+    body = r.read()
+    c.close()
+    assert r.getheader('Content-Encoding') == encoding, (url, encoding, r.getheader('Content-Encoding'))
+    return len(body)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('config', help='a config sqlite file, e.g. the one of a running deployment')
+    parser.add_argument('--events', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=3, help='seconds per endpoint, encoding and mode')
+    parser.add_argument('--gzip-level', type=int, help='level used in the per-request mode (default: the same as cached)')
+    parser.add_argument('--brotli-quality', type=int, default=5, help='quality used in the per-request mode, the cached one can afford the slowest')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp()
+    make_database(folder, 'bench', args.config, events=args.events)
+    port = free_port()
+    sys.argv = ['briefings_server.py', 'bench', folder]
+    import briefings_server as b
+    import cherrypy
+    b.setup_server({'server.socket_host': '127.0.0.1', 'server.socket_port': port, 'log.screen': False})
+    cherrypy.engine.start()
+
+    cached_levels = b.PAGE_GZIP_LEVEL, b.PAGE_BROTLI_QUALITY
+    per_request_levels = args.gzip_level or b.PAGE_GZIP_LEVEL, args.brotli_quality
+    encoded = b.CompressedPage.encoded
+    def per_request(self, encoding):
+        try:
+            return encoded(self, encoding)
+        finally:
+            if encoding:
+                self.encodings.pop(encoding, None)
+
+    modes = [('identity', None)] + [(mode, e) for e in b.PAGE_ENCODINGS for mode in ('per-request', 'cached')]
+    print('%-16s %-12s %-8s %9s %10s %12s %9s'%('endpoint', 'mode', 'encoding', 'bytes', 'req/s', 'cpu/req', 'p95'))
+    try:
+        for endpoint in args.endpoints.split(','):
+            for mode, encoding in modes:
+                b.CompressedPage.encoded = per_request if mode == 'per-request' else encoded
+                b.PAGE_GZIP_LEVEL, b.PAGE_BROTLI_QUALITY = per_request_levels if mode == 'per-request' else cached_levels
+                b.page_cache.invalidate()
+                headers = {'Accept-Encoding': encoding} if encoding else {}
+                size = wire_bytes(port, endpoint, encoding) # also renders the page, so it is not counted below
+                cpu = time.process_time()
+                latencies, errors = drive(port, [endpoint], 1, args.duration, headers)
+                cpu = time.process_time()-cpu
+                print('%-16s %-12s %-8s %9d %10.1f %10.3fms %7.2fms%s'%(endpoint, mode, encoding or '-', size, len(latencies)/args.duration,
+                                                                  1000*cpu/len(latencies), 1000*percentile(latencies, 95),
+                                                                  ' (%d errors)'%errors if errors else ''))
+    finally:
+        cherrypy.engine.exit()
@@ -0,0 +1,23 @@
+"""Per-lookup cost of `conf`, reading the config table on every call versus the in-memory snapshot.
+
+Run as `python benchmarks/conf_lookup.py SEMINAR_SERIES FOLDER_LOCATION`."""
+
+import os.path
+import sqlite3
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from briefings_server import conf, parse_conf, file_dir, CONF_FILENAME
+
+def uncached_conf(k):
+    v, vtype = next(sqlite3.connect(os.path.join(file_dir,CONF_FILENAME)).execute('SELECT value, valuetype FROM config WHERE key=?',(k,)))
+    return parse_conf(v, vtype)
+
+keys = ['event.name', 'email.cc', 'invitations.neededdays', 'server.publicfrontpageoverride', 'admin.pass']
+
+if __name__ == '__main__':
+    for name, f in [('uncached', uncached_conf), ('snapshot', conf)]:
+        n = 2000 if name == 'uncached' else 200000
+        t = min(timeit.repeat(lambda: [f(k) for k in keys], number=n//len(keys), repeat=3))
+        print('%-10s %8.2f us per lookup'%(name, t/n*1e6))
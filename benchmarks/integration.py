@@ -0,0 +1,134 @@
+"""Submit invitations end to end through `Invite.do` while one of the fake services is slow or failing.
+
+Every submission creates a Zoom meeting, an Etherpad schedule and a
+confirmation email against the fakes in `fakes.py`. Meanwhile a probe keeps
+requesting the front page, to show whether slow dependencies starve the
+other requests. Reports submission throughput and latency, the probe
+latency, the calls each fake received and how long the outbox took to
+deliver the emails.
+
+Run as `python benchmarks/integration.py CONFIG_SQLITE --slow zoom --latencies 0,0.2,1`."""
+
+import argparse
+import datetime
+import http.client
+import json
+import os.path
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from synthetic import make_database
+from fakes import FakeEtherpad, FakeSMTP, FakeTwitter, FakeZoom, configure
+from loadtest import free_port, percentile
+
+def submit(port, invitation, date):
+    form = {'uuid': invitation, 'date': date.isoformat(), 'speaker': 'Speaker '+invitation[:8], 'affiliation': 'Affiliation',
+            'bio': 'Bio', 'title': 'Title', 'abstract': 'Abstract', 'warmup': 'False', 'email': invitation[:8]+'@example.com',
+            'recording_consent': 'True', 'location': 'Room 1'}
+    c = http.client.HTTPConnection('127.0.0.1', port, timeout=600)
+    start = time.perf_counter()
+    c.request('POST', '/invite/do', body=urllib.parse.urlencode(form), headers={'Content-Type': 'application/x-www-form-urlencoded'})
+    r = c.getresponse()
+    ok = r.status == 200 and b'Submission successful' in r.read()
+    c.close()
+    return time.perf_counter()-start, ok
+
+def probe(port, stop, latencies):
+    c = http.client.HTTPConnection('127.0.0.1', port, timeout=600)
+    while not stop.is_set():
+        start = time.perf_counter()
+        c.request('GET', '/')
+        c.getresponse().read()
+        latencies.append(time.perf_counter()-start)
+        time.sleep(0.05)
+    c.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('config')
+    parser.add_argument('--slow', default='all', choices=['all', 'zoom', 'etherpad', 'smtp'], help='which fake gets the latency and errors')
+    parser.add_argument('--latencies', default='0,0.2,1', help='comma separated seconds added to every call')
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--submissions', type=int, default=30, help='per latency')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=10, help='size of the server thread pool')
+    parser.add_argument('--out', help='save the results as JSON')
+    args = parser.parse_args()
+    latencies = [float(l) for l in args.latencies.split(',')]
+
+    folder = tempfile.mkdtemp()
+    db = make_database(folder, 'bench', args.config, events=200, invitations=0, applications=0)
+    fakes = {'smtp': FakeSMTP(), 'zoom': FakeZoom(), 'etherpad': FakeEtherpad(), 'twitter': FakeTwitter()}
+    for fake in fakes.values():
+        fake.start()
+    port = free_port()
+    configure(os.path.join(folder, 'bench_config.sqlite'), **fakes)
+    with sqlite3.connect(os.path.join(folder, 'bench_config.sqlite')) as c:
+        c.executemany('UPDATE config SET value=? WHERE key=?', [(str(port), 'server.port'), (folder, 'zoom.recdownloads'), ('', 'server.alluser')])
+    # one invitation per submission, each with a date of its own far after the synthetic talks
+    first = datetime.datetime.now().replace(hour=11, minute=0, second=0, microsecond=0) + datetime.timedelta(days=400)
+    invitations = [(str(uuid.uuid4()), first+datetime.timedelta(days=i)) for i in range(args.submissions*len(latencies))]
+    with sqlite3.connect(db, detect_types=sqlite3.PARSE_DECLTYPES) as c:
+        c.executemany("INSERT INTO invitations (uuid, email, warmup, host, host_email, location, status, last_date) VALUES (?,?,0,'Host','host@example.com','Room 1','pending',?)",
+                      [(u, u[:8]+'@example.com', d) for u, d in invitations])
+        c.executemany('INSERT INTO invitation_dates (uuid, date) VALUES (?,?)', invitations)
+
+    sys.argv = ['briefings_server.py', 'bench', folder]
+    import briefings_server as b
+    import cherrypy
+    b.setup_server({'server.socket_host': '127.0.0.1', 'server.socket_port': port, 'server.thread_pool': args.threads})
+    cherrypy.engine.start()
+
+    slow = [fakes[args.slow]] if args.slow != 'all' else [fakes['smtp'], fakes['zoom'], fakes['etherpad']]
+    results = []
+    print('%8s %8s %9s %9s %9s %9s %6s %6s %6s %9s'%('latency', 'ok', 'subm/s', 'p50', 'p95', 'probe p95', 'zoom', 'pad', 'email', 'drain'))
+    try:
+        for level, latency in enumerate(latencies):
+            for fake in slow:
+                fake.latency, fake.error_rate = latency, args.error_rate
+            for name in ('zoom', 'etherpad', 'twitter'):
+                fakes[name].reset()
+            delivered = len(fakes['smtp'].messages)
+            batch = invitations[level*args.submissions:(level+1)*args.submissions]
+            stop, probes = threading.Event(), []
+            prober = threading.Thread(target=probe, args=(port, stop, probes))
+            prober.start()
+            outcomes, lock = [], threading.Lock()
+            def worker(jobs):
+                for u, d in jobs:
+                    r = submit(port, u, d)
+                    with lock:
+                        outcomes.append(r)
+            start = time.perf_counter()
+            workers = [threading.Thread(target=worker, args=(batch[i::args.concurrency],)) for i in range(args.concurrency)]
+            [t.start() for t in workers]
+            [t.join() for t in workers]
+            elapsed = time.perf_counter()-start
+            while len(fakes['smtp'].messages)-delivered < len(batch) and time.perf_counter()-start < elapsed+300: # the outbox sends in the background
+                time.sleep(0.1)
+            drain = time.perf_counter()-start
+            stop.set()
+            prober.join()
+            times = sorted(t for t, ok in outcomes)
+            probes.sort()
+            r = {'latency': latency, 'submissions': len(batch), 'ok': sum(ok for t, ok in outcomes), 'throughput': len(batch)/elapsed,
+                 'p50': 1000*percentile(times, 50), 'p95': 1000*percentile(times, 95),
+                 'probe_p50': 1000*percentile(probes, 50), 'probe_p95': 1000*percentile(probes, 95),
+                 'zoom_calls': fakes['zoom'].count(), 'etherpad_calls': fakes['etherpad'].count(),
+                 'emails': len(fakes['smtp'].messages)-delivered, 'drain': drain}
+            results.append(r)
+            print('%7.2fs %4d/%-3d %9.2f %7.0fms %7.0fms %7.0fms %6d %6d %6d %8.1fs'%(latency, r['ok'], len(batch), r['throughput'], r['p50'], r['p95'],
+                                                                                 r['probe_p95'], r['zoom_calls'], r['etherpad_calls'], r['emails'], drain))
+    finally:
+        cherrypy.engine.exit()
+        for fake in fakes.values():
+            fake.stop()
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=1)
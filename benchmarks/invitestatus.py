@@ -0,0 +1,62 @@
+"""Render time of /admin/invitestatus with the proposed dates as `repr` strings parsed by `eval`
+(how they were stored before migration 005), with the `invitation_dates` table, and with the
+materialized status of migration 006 that only renders one page.
+
+Run as `python benchmarks/invitestatus.py CONFIG_SQLITE [INVITATIONS]`."""
+
+import datetime
+import os.path
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from synthetic import make_database
+
+if __name__ == '__main__':
+    config = sys.argv[1]
+    invitations = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    folder = tempfile.mkdtemp()
+    make_database(folder, 'bench', config, invitations=invitations)
+    sys.argv = ['briefings_server.py', 'bench', folder]
+    import briefings_server as b
+
+    with b.conn() as c: # the old layout, side by side with the new one
+        c.execute('CREATE TABLE legacy_invitations (uuid TEXT PRIMARY KEY, email NOT NULL, confirmed_date TIMESTAMP, dates TEXT NOT NULL)')
+        proposed = {}
+        for uuid, date in c.execute('SELECT uuid, date FROM invitation_dates'):
+            proposed.setdefault(uuid, []).append(date)
+        c.executemany('INSERT INTO legacy_invitations VALUES (?,?,?,?)',
+                      [(uuid, email, confirmed_date, '|'.join(repr(d) for d in proposed[uuid]))
+                       for uuid, email, confirmed_date in c.execute('SELECT uuid, email, confirmed_date FROM invitations ORDER BY rowid')])
+
+    def old():
+        parsedates = lambda dates: [eval(d) for d in dates.split('|')]
+        with b.conn() as c:
+            all_invites = list(c.execute('SELECT uuid, email, confirmed_date, dates FROM legacy_invitations'))[::-1]
+        lim = datetime.datetime.now() + datetime.timedelta(days=b.conf('invitations.neededdays'))
+        all_invites = [(uuid, email, confirmed_date,
+                              'accepted for %s'%confirmed_date if confirmed_date
+                              else 'not accepted yet' if any(d>lim for d in parsedates(dates)) else 'expired')
+                for (uuid, email, confirmed_date, dates) in all_invites]
+        return b.templates.get_template('admin_invitestatus.html').render(all_invites=all_invites, status=None, page=0, more=False, statuses=[])
+
+    def dates_table():
+        with b.conn() as c:
+            lim = datetime.datetime.now() + datetime.timedelta(days=b.conf('invitations.neededdays'))
+            all_invites = list(c.execute("""SELECT uuid, email, confirmed_date,
+                                            EXISTS (SELECT 1 FROM invitation_dates WHERE invitation_dates.uuid=invitations.uuid AND date>?)
+                                            FROM invitations ORDER BY rowid DESC""", (lim,)))
+        all_invites = [(uuid, email, confirmed_date,
+                              'accepted for %s'%confirmed_date if confirmed_date
+                              else 'not accepted yet' if pending else 'expired')
+                for (uuid, email, confirmed_date, pending) in all_invites]
+        return b.templates.get_template('admin_invitestatus.html').render(all_invites=all_invites, status=None, page=0, more=False, statuses=[])
+
+    b.expire_invitations()
+    assert old() == dates_table()
+    print('%d invitations, ms per render'%invitations)
+    for name, f in [('eval of repr strings (old)', old), ('invitation_dates', dates_table),
+                    ('status column, one page', b.Admin().invitestatus),
+                    ('status column, pending page', lambda: b.Admin().invitestatus(status='pending'))]:
+        print('%-28s %8.1f'%(name, 1000*min(timeit.repeat(f, number=1, repeat=5))))
@@ -0,0 +1,147 @@
+"""Load test the public and admin pages of an in-process server with a synthetic database.
+
+SMTP, Zoom and Etherpad are replaced by the local fakes in `fakes.py`, so
+nothing leaves the machine. Every endpoint is driven at each concurrency
+level with keep-alive connections, and throughput and latency percentiles
+are printed and saved as JSON.
+
+Run as `python benchmarks/loadtest.py CONFIG_SQLITE --out results.json` (see
+`--help` for the database size and load), and compare two runs with
+`python benchmarks/loadtest.py --compare OLD.json NEW.json`."""
+
+import argparse
+import base64
+import datetime
+import http.client
+import json
+import os.path
+import platform
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from synthetic import make_database, repo_dir
+from fakes import FakeEtherpad, FakeSMTP, FakeZoom
+
+ENDPOINTS = ['/', '/iframeupcoming', '/past/', '/event', '/invite', '/admin/invitestatus']
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def percentile(latencies, p):
+    return latencies[min(len(latencies)-1, int(p/100*len(latencies)))]
+
+def drive(port, urls, concurrency, duration, headers):
+    """Request `urls` in turn from `concurrency` threads for `duration` seconds, return the latencies and the number of errors."""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.monotonic()+duration
+    def worker(offset):
+        c = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        mine, failed, i = [], 0, offset
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                c.request('GET', urls[i%len(urls)], headers=headers)
+                r = c.getresponse()
+                r.read()
+                if r.status != 200:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                c.close()
+                c = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            mine.append(time.perf_counter()-start)
+            i += 1
+        c.close()
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    return sorted(latencies), errors[0]
+
+def compare(old, new):
+    old = {(r['endpoint'], r['concurrency']): r for r in json.load(open(old))['results']}
+    new = {(r['endpoint'], r['concurrency']): r for r in json.load(open(new))['results']}
+    print('%-22s %5s %12s %12s %8s %10s %10s %8s'%('endpoint', 'conc', 'old req/s', 'new req/s', 'ratio', 'old p95', 'new p95', 'ratio'))
+    for k in sorted(old.keys() & new.keys()):
+        o, n = old[k], new[k]
+        print('%-22s %5d %12.1f %12.1f %8.2f %9.2fms %9.2fms %8.2f'%(k+(o['throughput'], n['throughput'], n['throughput']/o['throughput'],
+                                                                   o['p95'], n['p95'], n['p95']/o['p95'])))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('config', nargs='?', help='a config sqlite file, e.g. the one of a running deployment')
+    parser.add_argument('--events', type=int, default=500)
+    parser.add_argument('--invitations', type=int, default=1000)
+    parser.add_argument('--applications', type=int, default=100)
+    parser.add_argument('--concurrency', default='1,4,16', help='comma separated numbers of client threads')
+    parser.add_argument('--duration', type=float, default=5, help='seconds per endpoint and concurrency level')
+    parser.add_argument('--threads', type=int, default=10, help='size of the server thread pool')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--out', help='save the results as JSON')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two saved results instead of running')
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        sys.exit()
+    if not args.config:
+        parser.error('the config sqlite file is required')
+
+    folder = tempfile.mkdtemp()
+    db = make_database(folder, 'bench', args.config, events=args.events, invitations=args.invitations, applications=args.applications)
+    smtp, zoom, pad = FakeSMTP().start(), FakeZoom().start(), FakeEtherpad().start()
+    port = free_port()
+    with sqlite3.connect(os.path.join(folder, 'bench_config.sqlite')) as c:
+        c.executemany('UPDATE config SET value=? WHERE key=?', [
+            ('127.0.0.1', 'email.SMTPhost'), (str(smtp.address[1]), 'email.SMTPport'),
+            (pad.url, 'etherpad.url'), (str(port), 'server.port'), (folder, 'zoom.recdownloads'),
+            ('', 'server.alluser')])
+    with sqlite3.connect(db) as c:
+        now = datetime.datetime.now()
+        past = [urllib.parse.quote(str(d)) for d, in c.execute('SELECT date FROM events WHERE date<? ORDER BY date DESC LIMIT 50', (now,))]
+        invites = [u for u, in c.execute("SELECT uuid FROM invitations WHERE status='pending' LIMIT 50")]
+
+    sys.argv = ['briefings_server.py', 'bench', folder]
+    import briefings_server as b
+    import cherrypy
+    b.zoom_client = b.ZoomClient(api_url=zoom.url+'/v2', oauth_url=zoom.url+'/oauth')
+    b.setup_server({'server.socket_host': '127.0.0.1', 'server.socket_port': port, 'server.thread_pool': args.threads})
+    cherrypy.engine.start()
+
+    credentials = base64.b64encode(('%s:%s'%(b.conf('admin.user'), b.conf('admin.pass'))).encode()).decode()
+    urls = {'/event': ['/event/%s/0/'%d for d in past],
+            '/invite': ['/invite/%s/'%u for u in invites]}
+    results = []
+    print('%-22s %5s %8s %6s %10s %9s %9s %9s'%('endpoint', 'conc', 'requests', 'errors', 'req/s', 'p50', 'p95', 'p99'))
+    try:
+        for concurrency in map(int, args.concurrency.split(',')):
+            for endpoint in args.endpoints.split(','):
+                headers = {'Authorization': 'Basic '+credentials} if endpoint.startswith('/admin') else {}
+                drive(port, urls.get(endpoint, [endpoint]), 1, 0.5, headers) # warm up the caches and connections
+                latencies, errors = drive(port, urls.get(endpoint, [endpoint]), concurrency, args.duration, headers)
+                r = {'endpoint': endpoint, 'concurrency': concurrency, 'requests': len(latencies), 'errors': errors,
+                     'throughput': len(latencies)/args.duration,
+                     **{'p%d'%p: 1000*percentile(latencies, p) for p in (50, 95, 99)}, 'max': 1000*latencies[-1]}
+                results.append(r)
+                print('%-22s %5d %8d %6d %10.1f %7.2fms %7.2fms %7.2fms'%(endpoint, concurrency, r['requests'], errors, r['throughput'], r['p50'], r['p95'], r['p99']))
+    finally:
+        cherrypy.engine.exit()
+        for fake in (smtp, zoom, pad):
+            fake.stop()
+    if args.out:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repo_dir, stdout=subprocess.PIPE).stdout.decode().strip()
+        with open(args.out, 'w') as f:
+            json.dump({'commit': commit, 'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                       'cpus': os.cpu_count(), 'args': {k: v for k, v in vars(args).items() if k not in ('compare', 'out')},
+                       'results': results}, f, indent=1)
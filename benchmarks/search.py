@@ -0,0 +1,40 @@
+"""Latency of /past/search on a synthetic archive, 50k talks by default.
+
+Run as `python benchmarks/search.py CONFIG_SQLITE [TALKS]`."""
+
+import os.path
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from synthetic import make_database
+
+QUERIES = ['the', 'quantum', 'photon', 'quantum network', 'single photon source', 'kariism',
+           'trasenide', 'zomoory lattice', 'Photonic', 'nonexistentword']
+
+if __name__ == '__main__':
+    config = sys.argv[1]
+    talks = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    folder = tempfile.mkdtemp()
+    start = time.monotonic()
+    make_database(folder, 'bench', config, events=talks, future=10, invitations=10, applications=0)
+    print('built an archive of %d talks in %.0fs'%(talks, time.monotonic()-start))
+    sys.argv = ['briefings_server.py', 'bench', folder]
+    import briefings_server as b
+
+    past = b.Past()
+    print('%-24s %8s %10s %10s %10s'%('query', 'matches', 'first [ms]', 'page [ms]', 'json [ms]'))
+    for q in QUERIES:
+        with b.conn() as c:
+            matches, = c.execute('SELECT count(*) FROM talks_fts WHERE talks_fts MATCH ?', (b.search_query(q),)).fetchone()
+        timings = []
+        for f in [lambda: b.Past.search_page(q, 0), lambda: b.Past.search_page(q, 3),
+                  lambda: past.search.__wrapped__(past, q=q, format='json')]:
+            runs = []
+            for _ in range(5):
+                t = time.perf_counter()
+                f()
+                runs.append(time.perf_counter()-t)
+            timings.append(1000*sorted(runs)[len(runs)//2])
+        print('%-24s %8d %10.2f %10.2f %10.2f'%(q, matches, *timings))
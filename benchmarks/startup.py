@@ -0,0 +1,76 @@
+"""Measure how long `briefings_server.py` takes to import and to serve its first request.
+
+Each measurement runs in a fresh interpreter: the import alone (what helper
+scripts like `new_pad.py` pay), and the time from launching the server until
+`/` answers, with an empty and with a filled Jinja bytecode cache. Also lists
+the slow optional modules that got imported.
+
+Run as `python benchmarks/startup.py CONFIG_SQLITE [RUNS]`."""
+
+import json
+import os.path
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from synthetic import make_database, repo_dir
+
+LAZY_MODULES = ['requests', 'py_etherpad', 'ics', 'pytz', 'twitter', 'requests_oauthlib']
+
+IMPORT = '''
+import sys, time, json
+sys.argv = ['briefings_server.py', 'bench', %r]
+start = time.perf_counter()
+import briefings_server
+print(json.dumps({'seconds': time.perf_counter()-start, 'loaded': [m for m in %r if m in sys.modules]}))
+'''
+
+def import_time(folder):
+    out = subprocess.run([sys.executable, '-c', IMPORT%(folder, LAZY_MODULES)], cwd=repo_dir, stdout=subprocess.PIPE, check=True).stdout
+    return json.loads(out.decode().strip().splitlines()[-1])
+
+def first_request(folder, port):
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, 'briefings_server.py', 'bench', folder], cwd=repo_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                urllib.request.urlopen('http://127.0.0.1:%d/'%port, timeout=10).read()
+                return time.perf_counter()-start
+            except OSError:
+                if server.poll() is not None:
+                    raise Exception('the server exited, see %s/bench.log'%folder)
+                time.sleep(0.005)
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == '__main__':
+    config = sys.argv[1]
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    folder = tempfile.mkdtemp()
+    make_database(folder, 'bench', config, events=200)
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    import sqlite3
+    with sqlite3.connect(os.path.join(folder, 'bench_config.sqlite')) as c:
+        c.executemany('UPDATE config SET value=? WHERE key=?', [(str(port), 'server.port'), (folder, 'zoom.recdownloads'), ('', 'server.alluser')])
+
+    imports = [import_time(folder) for _ in range(runs)]
+    print('import:                       %6.0fms (median of %d), slow modules loaded: %s'%(
+        1000*statistics.median(i['seconds'] for i in imports), runs, ', '.join(imports[0]['loaded']) or 'none'))
+    cold, warm = [], []
+    for _ in range(runs):
+        shutil.rmtree(os.path.join(folder, 'jinja_cache'), ignore_errors=True)
+        cold.append(first_request(folder, port))
+        time.sleep(0.5) # the templates are compiled into the cache in the background after the start
+        warm.append(first_request(folder, port))
+    print('first request, empty cache:   %6.0fms'%(1000*statistics.median(cold)))
+    print('first request, filled cache:  %6.0fms'%(1000*statistics.median(warm)))
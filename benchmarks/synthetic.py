@@ -0,0 +1,66 @@
+"""Synthetic databases for the benchmarks, built with `create_db.sh`."""
+
+import datetime
+import itertools
+import os
+import os.path
+import random
+import shutil
+import sqlite3
+import subprocess
+import uuid
+
+repo_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+
+WORDS = '''quantum photonic spin qubit entanglement network error correction superconducting
+cavity optics laser lattice atom ion trap measurement noise fidelity gate protocol
+channel memory repeater sensing metrology topological fermion boson phonon magnon
+waveguide resonator detector single photon source frequency comb nonlinear squeezed'''.split()
+
+# English function words, then the physics words, then a long tail of made-up words, drawn
+# with Zipf's law like real text, so that full-text queries see both very common and rare terms.
+VOCABULARY = 'the of and in a to we is for with on that by this are as from at be an'.split() + WORDS + [a+b+c for a in ['ka', 'lo', 'mi', 'ne', 'su', 'tra', 've', 'zo'] for b in ['ri', 'ta', 'phe', 'mo', 'lu', 'sen']
+                      for c in ['on', 'ic', 'um', 'ar', 'ism', 'ide', 'ene', 'ase', 'ory', 'ent']]
+CUM_WEIGHTS = list(itertools.accumulate(1/(rank+1) for rank in range(len(VOCABULARY))))
+
+def words(n, rng):
+    return ' '.join(rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=n))
+
+def make_database(folder, series, config, events=500, future=10, invitations=500, applications=50, seed=0):
+    """Create `folder/{series}_database.sqlite` filled with synthetic data and copy the `config` sqlite file next to it.
+
+    Talks are a week apart, `future` of them in the future. The first future
+    talk is a week away and all past talks have their recordings processed,
+    so the scheduled jobs have nothing to do."""
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    subprocess.check_call(['sh', os.path.join(repo_dir, 'create_db.sh')], cwd=folder, stdout=subprocess.DEVNULL)
+    db = os.path.join(folder, '%s_database.sqlite'%series)
+    os.replace(os.path.join(folder, 'database.sqlite'), db)
+    shutil.copy(config, os.path.join(folder, '%s_config.sqlite'%series))
+    today = datetime.datetime.now().replace(hour=11, minute=0, second=0, microsecond=0)
+    dates = [today + datetime.timedelta(days=7*(i-events+future+1)) for i in range(events)]
+    c = sqlite3.connect(db)
+    with c:
+        c.executemany('INSERT INTO events (date, speaker, affiliation, bio, title, abstract, warmup, email, conf_link, sched_link, recording_consent, location, announced, recording_processed) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)',
+                      [(d, words(2, rng).title(), words(3, rng).title(), words(80, rng), words(8, rng).capitalize(), words(200, rng),
+                        0, 'speaker%d@example.com'%i, 'https://zoom.example.com/j/%d'%i, 'https://pad.example.com/p/%d'%i,
+                        rng.random()<0.8, 'Room %d'%rng.randint(1,9), 2 if d<today else 0, 1)
+                       for i, d in enumerate(dates)])
+        invites = [(str(uuid.UUID(int=rng.getrandbits(128))), 'invitee%d@example.com'%i, rng.sample(dates, 3), False,
+                    dates[i] if i<len(dates) and rng.random()<0.5 else None,
+                    'Host', 'host@example.com', 'Room 1')
+                   for i in range(invitations)]
+        c.executemany('INSERT INTO invitations (uuid, email, warmup, confirmed_date, host, host_email, location) VALUES (?,?,?,?,?,?,?)',
+                      [i[:2]+i[3:] for i in invites])
+        c.executemany('INSERT INTO invitation_dates (uuid, date) VALUES (?,?)', [(i[0], d) for i in invites for d in i[2]])
+        c.execute("""UPDATE invitations SET last_date=(SELECT max(date) FROM invitation_dates WHERE invitation_dates.uuid=invitations.uuid),
+                     status=CASE WHEN confirmed_date IS NOT NULL THEN 'accepted' ELSE 'pending' END""")
+        apps = [(str(uuid.UUID(int=rng.getrandbits(128))), words(2, rng).title(), words(3, rng).title(), words(40, rng), words(8, rng).capitalize(), words(100, rng),
+                 True, 'applicant%d@example.com'%i, rng.sample(dates[-future:], 2))
+                for i in range(applications)]
+        c.executemany('INSERT INTO applications (uuid, speaker, affiliation, bio, title, abstract, warmup, email) VALUES (?,?,?,?,?,?,?,?)',
+                      [a[:-1] for a in apps])
+        c.executemany('INSERT INTO application_dates (uuid, date) VALUES (?,?)', [(a[0], d) for a in apps for d in a[-1]])
+    c.close()
+    return db
@@ -0,0 +1,58 @@
+"""Wall time and CPU-seconds per hour of video of the recording transcode stage.
+
+Compares the old single baseline re-encode with the remux path (an H.264/AAC
+recording, as Zoom makes them) and the bitrate ladder (an MPEG-4 Part 2
+recording, which has to be re-encoded). The test recordings are generated
+with ffmpeg, `ffmpeg` and `ffprobe` need to be on the PATH.
+
+Run as `python benchmarks/transcode.py CONFIG_SQLITE [SECONDS]`."""
+
+import os.path
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from synthetic import make_database
+
+def make_recording(filename, seconds, vcodec):
+    subprocess.run(['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i', 'testsrc2=size=1920x1080:rate=25:duration=%d'%seconds,
+                    '-f', 'lavfi', '-i', 'sine=duration=%d'%seconds, '-c:v', vcodec, '-b:v', '2000k', '-c:a', 'aac', '-shortest', filename],
+                   check=True)
+
+def measure(f):
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.monotonic()
+    f()
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.monotonic()-start, after.ru_utime+after.ru_stime-before.ru_utime-before.ru_stime
+
+if __name__ == '__main__':
+    config = sys.argv[1]
+    seconds = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    folder = tempfile.mkdtemp()
+    make_database(folder, 'bench', config, events=20)
+    sys.argv = ['briefings_server.py', 'bench', folder]
+    import briefings_server as b
+
+    b.RECORDING_FOLDER = folder+'/recordings'
+    os.makedirs(b.RECORDING_FOLDER+'/hls')
+    jobs = b.RecordingJobs(b.RECORDING_STAGE_WORKERS)
+    h264 = folder+'/h264.mp4'
+    mpeg4 = folder+'/mpeg4.mp4'
+    make_recording(h264, seconds, 'libx264')
+    make_recording(mpeg4, seconds, 'mpeg4')
+
+    def old():
+        jobs.run(['ffmpeg', '-y', '-i', h264, '-profile:v', 'baseline', '-level', '3.0', '-start_number', '0',
+                  '-hls_time', '10', '-hls_list_size', '0', '-f', 'hls', b.RECORDING_FOLDER+'/hls/old.m3u8'])
+
+    print('%d cores, %ds of 1080p video, per hour of video:'%(os.cpu_count(), seconds))
+    print('%-32s %10s %12s'%('', 'wall [s]', 'CPU [s]'))
+    for name, f in [('baseline re-encode (old)', old),
+                    ('remux (H.264 source)', lambda: jobs.encode(h264, 'remux')),
+                    ('ladder %s'%','.join(b.HLS_LADDER), lambda: jobs.encode(mpeg4, 'ladder'))]:
+        wall, cpu = measure(f)
+        print('%-32s %10.0f %12.0f'%(name, wall*3600/seconds, cpu*3600/seconds))
@@ -0,0 +1,47 @@
+"""Count the HTTP round trips and connections each Zoom workflow makes, against the local `fakes.FakeZoom`.
+
+Run as `python benchmarks/zoom_roundtrips.py CONFIG_SQLITE`."""
+
+import datetime
+import os.path
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from synthetic import make_database
+from fakes import FakeZoom
+
+if __name__ == '__main__':
+    _, config = sys.argv
+    folder = tempfile.mkdtemp()
+    make_database(folder, 'bench', config, events=20)
+    sys.argv = ['briefings_server.py', 'bench', folder]
+    import briefings_server as b
+
+    fake = FakeZoom().start()
+    b.zoom_client = b.ZoomClient(api_url=fake.url+'/v2', oauth_url=fake.url+'/oauth')
+
+    def makezoom():
+        b.Invite.makezoom({'date': datetime.datetime.now(), 'warmup': False, 'speaker': 'Speaker'})
+    def recording_metadata():
+        b.Zoom.patch('/meetings/1000/recordings/settings', data={"recording_authentication": False})
+        b.Zoom.get('/meetings/1000/recordings').json()
+    def concurrent_makezoom():
+        b.zoom_client.expires = 0
+        threads = [threading.Thread(target=makezoom) for _ in range(8)]
+        [t.start() for t in threads]
+        [t.join() for t in threads]
+    def expired_token():
+        fake.expire_token() # Zoom revokes the cached token, the client sees a 401 and refreshes
+        makezoom()
+
+    print('%-28s %8s %8s %12s'%('workflow', 'token', 'api', 'connections'))
+    for name, f in [('makezoom (cold)', makezoom), ('makezoom (warm)', makezoom),
+                    ('recording metadata', recording_metadata),
+                    ('8 threads, token expired', concurrent_makezoom),
+                    ('token revoked', expired_token)]:
+        fake.reset()
+        f()
+        print('%-28s %8d %8d %12d'%(name, fake.count('/oauth'), fake.count('/v2'), fake.connections))
+    fake.stop()
@@ -1,20 +1,38 @@
+import atexit
 import base64
+import bisect
+import calendar
+import collections
+import concurrent.futures
+import contextlib
 import csv
 import datetime
 import email
 import email.mime
 import email.mime.base
+import email.policy
+import glob
+import gzip
+import functools
 import hashlib
+import heapq
 import html
+import inspect
 import itertools
 import io
 import json
 import logging
+import logging.handlers
+import mimetypes
 import os.path
+import queue
 import random
+import re
+import shutil
 import smtplib
 import sqlite3
 import socket
+import subprocess
 import sys
 import tempfile
 import threading
@@ -24,17 +42,16 @@ import urllib.parse
 import uuid
 
 import cherrypy
-from cherrypy.process.plugins import Monitor
+from cherrypy.lib import cptools, httputil
+from cherrypy.lib.static import serve_file
 import jinja2
 import dateutil
 import dateutil.parser
-import py_etherpad
-import rauth
-import requests
-import ics
-import pytz
-
-from twitter import Twitter
+try:
+    import brotli
+except ImportError:
+    brotli = None
+# requests, py_etherpad, ics, pytz and twitter are imported on first use, they are slow to import and most processes never need them
 
 # TODO unify admin_judge, apply_index, and invite_index / unify the invitations and applications tables
 
@@ -54,22 +71,495 @@ if not os.path.exists(os.path.join(file_dir,DB_FILENAME)):
     raise Exception('Please run `create_db.sh` in order to create an empty sqlite database.')
 if not os.path.exists(os.path.join(file_dir,CONF_FILENAME)):
     raise Exception('You need a configuration settings database file (maybe copy one of the already available and then edit it from the /admin page).')
+SCHEMA_VERSION = max(int(os.path.basename(f).split('_')[0]) for f in glob.glob(os.path.join(file_dir,'migrations','*.sql')))
+if next(sqlite3.connect(os.path.join(file_dir,DB_FILENAME)).execute('PRAGMA user_version'))[0] < SCHEMA_VERSION:
+    raise Exception('The database schema is out of date. Please run `update_db.sh` on it in order to apply the new migrations.')
+
 
+LOG_FORMAT = '%(asctime)s:%(name)s:%(levelname)s:%(message)s'
+LOG_MAX_BYTES = 20*1024*1024 # the log is rotated when it grows past this size
+LOG_BACKUPS = 10 # rotated logs kept, gzipped
 
+def compress_log(source, dest):
+    with open(source, 'rb') as f, gzip.open(dest, 'wb') as g:
+        shutil.copyfileobj(f, g)
+    os.remove(source)
+
+# Records are put on a queue by the logging threads and written (and rotated) by the listener thread
 logfile = os.path.join(file_dir,LOG_FILENAME)
-logging.basicConfig(filename=logfile,format='%(asctime)s:%(name)s:%(levelname)s:%(message)s',level=logging.DEBUG)
+log_handler = logging.handlers.RotatingFileHandler(logfile, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS)
+log_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+log_handler.namer = lambda name: name+'.gz'
+log_handler.rotator = compress_log
+log_queue = queue.SimpleQueue()
+log_listener = logging.handlers.QueueListener(log_queue, log_handler)
+queue_handler = logging.handlers.QueueHandler(log_queue)
+queue_handler.setFormatter(logging.Formatter('%(message)s')) # only merges the arguments and traceback into the message, LOG_FORMAT is applied by log_handler
+logging.basicConfig(handlers=[queue_handler],level=logging.DEBUG)
+log_listener.start()
+atexit.register(log_listener.stop) # runs before logging's own shutdown, so that the queue is flushed first
 log = logging.getLogger('briefings')
 
 
+METRICS_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30) # seconds
+METRICS_HELP = {
+    'briefings_requests_total': ('counter', 'HTTP requests by mounted app and status code'),
+    'briefings_request_duration_seconds': ('histogram', 'Time from the start of a request until its response is written'),
+    'briefings_operation_duration_seconds': ('histogram', 'Time spent in database queries, config lookups, template rendering and calls to SMTP, Zoom, Etherpad and Twitter'),
+    'briefings_page_cache_total': ('counter', 'Page cache lookups by result'),
+}
+
+class Metrics:
+    """Counters and latency histograms, served in the Prometheus text format on /dev/metrics.
+
+    Labels are tuples of (name, value) pairs. Histogram buckets are stored
+    per bucket and only made cumulative when rendering."""
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = collections.defaultdict(int)
+        self.histograms = {}
+
+    def inc(self, name, labels=(), n=1):
+        with self.lock:
+            self.counters[(name, labels)] += n
+
+    def observe(self, name, labels, seconds):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            h = self.histograms.get((name, labels))
+            if h is None:
+                h = self.histograms[(name, labels)] = [0]*(len(self.buckets)+1)+[0.0] # the +Inf bucket, then the sum
+            h[i] += 1
+            h[-1] += seconds
+
+    def render(self, extra=()):
+        with self.lock:
+            counters = list(self.counters.items())+list(extra)
+            histograms = [(k, list(h)) for k, h in self.histograms.items()]
+        samples = collections.defaultdict(list)
+        for (name, labels), v in sorted(counters):
+            samples[name].append('%s%s %s'%(name, metric_labels(labels), v))
+        for (name, labels), h in sorted(histograms):
+            total = 0
+            for le, n in zip(list(self.buckets)+['+Inf'], h[:-1]):
+                total += n
+                samples[name].append('%s_bucket%s %d'%(name, metric_labels(labels+(('le', le),)), total))
+            samples[name].append('%s_sum%s %r'%(name, metric_labels(labels), h[-1]))
+            samples[name].append('%s_count%s %d'%(name, metric_labels(labels), total))
+        lines = []
+        for name in sorted(samples):
+            kind, help = METRICS_HELP.get(name, ('untyped', ''))
+            lines += ['# HELP %s %s'%(name, help), '# TYPE %s %s'%(name, kind)] + samples[name]
+        return '\n'.join(lines)+'\n'
+
+def metric_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}'%','.join('%s="%s"'%(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in labels)
+
+metrics = Metrics()
+
+TRACE_BUFFER = 200 # most recent traces kept for /dev/traces
+TRACE_SLOWEST = 20 # slowest traces kept separately, so that they are not pushed out by fast ones
+TRACE_MAX_SPANS = 1000 # spans recorded per trace, further ones are only counted
+
+class Trace:
+    """The spans of one request or background job, as (kind, op, depth, start, duration, error) lists with times in seconds from the start of the trace."""
+    __slots__ = ('id', 'name', 'started', 't0', 'duration', 'spans', 'depth', 'dropped', 'error')
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started = datetime.datetime.now()
+        self.t0 = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self.depth = 0
+        self.dropped = 0
+        self.error = None
+
+    def json(self):
+        return {'id': self.id, 'name': self.name, 'started': self.started.isoformat(), 'duration': self.duration,
+                'error': self.error, 'dropped': self.dropped,
+                'spans': [dict(zip(('kind', 'op', 'depth', 'start', 'duration', 'error'), s)) for s in self.spans]}
+
+class Tracer:
+    """Keeps the trace of the current thread and the finished ones, see `span` and `Tracer.trace`."""
+    def __init__(self, size=TRACE_BUFFER, slowest=TRACE_SLOWEST):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.recent = collections.deque(maxlen=size)
+        self.slowest = [] # heap of (duration, id, trace)
+        self.nslowest = slowest
+
+    def current(self):
+        return getattr(self.local, 'trace', None)
+
+    def begin(self, name):
+        trace = self.local.trace = Trace(name)
+        return trace
+
+    def end(self, trace, error=None):
+        if self.current() is trace:
+            self.local.trace = None
+        trace.duration = time.perf_counter()-trace.t0
+        trace.error = error
+        with self.lock:
+            self.recent.append(trace)
+            item = (trace.duration, trace.id, trace)
+            if len(self.slowest) < self.nslowest:
+                heapq.heappush(self.slowest, item)
+            elif item > self.slowest[0]:
+                heapq.heapreplace(self.slowest, item)
+
+    @contextlib.contextmanager
+    def trace(self, name):
+        """Trace a background job, nested calls join the trace that is already running."""
+        if self.current() is not None:
+            with span('job', name):
+                yield
+            return
+        trace = self.begin(name)
+        try:
+            yield trace
+        except Exception as e:
+            self.end(trace, error=str(e))
+            raise
+        self.end(trace)
+
+    def traced(self, f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            with self.trace(f.__name__):
+                return f(*args, **kwargs)
+        return wrapper
+
+    def get(self, id):
+        with self.lock:
+            return next((t for t in itertools.chain(self.recent, (t for _,_,t in self.slowest)) if t.id == id), None)
+
+    def snapshot(self):
+        with self.lock:
+            return list(reversed(self.recent)), [t for _,_,t in sorted(self.slowest, reverse=True)]
+
+tracer = Tracer()
+
+class span:
+    """Context manager adding a span to the trace of the current thread, if there is one."""
+    __slots__ = ('kind', 'op', 'trace', 'record', 'start')
+    def __init__(self, kind, op=''):
+        self.kind = kind
+        self.op = op
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.trace = trace = tracer.current()
+        if trace is not None:
+            if len(trace.spans) < TRACE_MAX_SPANS:
+                self.record = [self.kind, self.op, trace.depth, self.start-trace.t0, None, None]
+                trace.spans.append(self.record)
+            else:
+                self.record = None
+                trace.dropped += 1
+            trace.depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        trace = self.trace
+        if trace is not None:
+            trace.depth -= 1
+            if self.record is not None:
+                self.record[4] = time.perf_counter()-self.start
+                if exc is not None:
+                    self.record[5] = str(exc)
+
+class timed(span):
+    """Context manager recording the duration of an operation of the given `kind` (db, conf, render, compress, smtp, zoom, etherpad, twitter), also as a span of the current trace."""
+    __slots__ = ('labels',)
+    def __init__(self, kind, op=''):
+        super().__init__(kind, op)
+        self.labels = (('kind', kind), ('op', op))
+
+    def __exit__(self, *exc):
+        super().__exit__(*exc)
+        metrics.observe('briefings_operation_duration_seconds', self.labels, time.perf_counter()-self.start)
+
+class MetricsTool(cherrypy.Tool):
+    """Count the requests of every mounted app by status and record their latency, on with `tools.metrics.on`."""
+    def __init__(self):
+        super().__init__('on_start_resource', self.start)
+
+    def _setup(self):
+        super()._setup()
+        cherrypy.request.hooks.attach('on_end_request', self.end)
+
+    def start(self):
+        request = cherrypy.request
+        request.metrics_start = time.perf_counter()
+        request.trace = tracer.begin('%s %s%s'%(request.method, request.script_name, request.path_info))
+        cherrypy.response.headers['X-Trace-Id'] = request.trace.id
+
+    def end(self):
+        request = cherrypy.request
+        app = type(request.app.root).__name__ if request.app else ''
+        status = str(cherrypy.response.status).split()[0]
+        tracer.end(request.trace, error=None if status < '500' else status)
+        metrics.inc('briefings_requests_total', (('app', app), ('status', status)))
+        metrics.observe('briefings_request_duration_seconds', (('app', app),), time.perf_counter()-request.metrics_start)
+
+cherrypy.tools.metrics = MetricsTool()
+
+
 sqlite3.register_adapter(bool, int)
 sqlite3.register_converter("BOOLEAN", lambda v: bool(int(v)))
 
+DB_BUSY_TIMEOUT = 10 # seconds to wait for a lock before raising "database is locked"
+DB_CACHE_SIZE = -16000 # negative values are in KiB, i.e. 16MB of page cache per connection
+DB_MMAP_SIZE = 64*1024*1024
+DB_CACHED_STATEMENTS = 256
+
+DB_WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE') # the ones sqlite3 opens a transaction for
+
+def timed_execute(connection, execute, *args):
+    """Run `execute`, opening the transaction of a write statement ourselves to record the lock wait.
+
+    sqlite3 would open it with a deferred BEGIN and take the write lock in the
+    statement itself, so the wait (up to busy_timeout) could not be told apart
+    from running the statement. Only the BEGIN IMMEDIATE is timed."""
+    op = args[0].lstrip()[:7].upper().rstrip()
+    with timed('db', op[:6]):
+        if op in DB_WRITE_STATEMENTS and not connection.in_transaction:
+            t = time.monotonic()
+            sqlite3.Connection.execute(connection, 'BEGIN IMMEDIATE')
+            pool.record_lock_wait(time.monotonic()-t)
+        return execute(*args)
+
+class PooledCursor(sqlite3.Cursor):
+    def execute(self, *args):
+        return timed_execute(self.connection, super().execute, *args)
+
+    def executemany(self, *args):
+        return timed_execute(self.connection, super().executemany, *args)
+
+class PooledConnection(sqlite3.Connection):
+    changed_dates = None # dates of the talks written, set by the temporary triggers on `events`, see `ConnectionPool.connect`
+
+    def __exit__(self, *args):
+        r = super().__exit__(*args)
+        self.committed() # only after the commit, so a concurrent render can not cache the old data as new
+        return r
+
+    def commit(self):
+        super().commit()
+        self.committed()
+
+    def committed(self):
+        if self.changed_dates:
+            dates, self.changed_dates = self.changed_dates, None
+            page_cache.invalidate()
+            exporter.changed(dates)
+            scheduler.notify()
+
+    def cursor(self, factory=PooledCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return timed_execute(self, super().execute, *args)
+
+    def executemany(self, *args):
+        return timed_execute(self, super().executemany, *args)
+
+class ConnectionPool:
+    """One connection per thread (and row format), reused across requests.
+
+    The connections of threads that are no longer alive are closed whenever
+    a new connection is opened."""
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.connections = {}
+        self.lock_waits = 0
+        self.lock_wait_time = 0.
+        self.lock_wait_max = 0.
+
+    def connect(self, d):
+        conn = sqlite3.connect(self.filename, detect_types=sqlite3.PARSE_DECLTYPES,
+                               timeout=DB_BUSY_TIMEOUT, cached_statements=DB_CACHED_STATEMENTS,
+                               check_same_thread=False, # only ever used by its own thread, but closed by others when pruning
+                               factory=PooledConnection)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = 1")
+        conn.execute("PRAGMA cache_size = %d"%DB_CACHE_SIZE)
+        conn.execute("PRAGMA mmap_size = %d"%DB_MMAP_SIZE)
+        def events_changed(date):
+            if conn.changed_dates is None:
+                conn.changed_dates = set()
+            conn.changed_dates.add(date)
+        conn.create_function('events_changed', 1, events_changed)
+        for op, rows in [('INSERT', ['NEW']), ('UPDATE', ['OLD', 'NEW']), ('DELETE', ['OLD'])]:
+            conn.execute('CREATE TEMP TRIGGER events_changed_%s AFTER %s ON main.events BEGIN %s END'%(
+                op.lower(), op, ' '.join('SELECT events_changed(%s.date);'%r for r in rows)))
+        if d:
+            conn.row_factory = dict_factory
+        return conn
+
+    def get(self, d=False):
+        key = (threading.current_thread(), d)
+        conn = self.connections.get(key)
+        if conn is None:
+            conn = self.connect(d)
+            with self.lock:
+                self.prune()
+                self.connections[key] = conn
+        return conn
+
+    def prune(self):
+        for key in [k for k in self.connections if not k[0].is_alive()]:
+            self.connections.pop(key).close()
+
+    def record_lock_wait(self, t):
+        with self.lock:
+            self.lock_waits += 1
+            self.lock_wait_time += t
+            self.lock_wait_max = max(self.lock_wait_max, t)
+
+    def stats(self):
+        with self.lock:
+            return {'connections': len(self.connections),
+                    'threads': len(set(t for t,d in self.connections)),
+                    'write_transactions': self.lock_waits,
+                    'lock_wait_total_s': self.lock_wait_time,
+                    'lock_wait_max_s': self.lock_wait_max,
+                    'lock_wait_mean_s': self.lock_wait_time/self.lock_waits if self.lock_waits else 0.}
+
+pool = ConnectionPool(os.path.join(file_dir,DB_FILENAME))
+
 def conn(d=False): # TODO make d=True default
-    conn = sqlite3.connect(os.path.join(file_dir,DB_FILENAME), detect_types=sqlite3.PARSE_DECLTYPES)
-    conn.execute("PRAGMA foreign_keys = 1")
-    if d:
-        conn.row_factory = dict_factory
-    return conn
+    return pool.get(d)
+
+PAGE_CACHE_SIZE = 256 # number of rendered pages kept in memory
+PAGE_CACHE_TTL = 300 # seconds, the upcoming/past boundary moves with the clock even if nothing is written
+
+class PageCache:
+    """Bounded LRU cache of rendered pages, keyed by route and arguments.
+
+    Entries are valid for the generation in which they were rendered (bumped
+    on every committed write to `events`, on config reloads and when
+    `observe` sees a new version of `events`, e.g. written by another
+    process, or a new value of a window, e.g. a talk becoming past) and for
+    at most `ttl` seconds."""
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.generation = 0
+        self.version = None # of the events table, as last seen by `observe`
+        self.windows = {} # last value of each `conditional` window function, as seen by `observe`
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def observe(self, version, window=None, shifted=None):
+        """Drop every entry if the events table changed since the last call, or the value `shifted` of the `window` function did (the clock moved a talk)."""
+        with self.lock:
+            changed = self.version is not None and version != self.version
+            if window is not None:
+                changed = changed or window in self.windows and self.windows[window] != shifted
+                self.windows[window] = shifted
+            self.version = version
+        if changed:
+            self.invalidate()
+
+    def get(self, key, render):
+        now = time.monotonic()
+        with self.lock:
+            generation = self.generation
+            entry = self.entries.get(key)
+            if entry and entry[0] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        page = render()
+        with self.lock:
+            if generation == self.generation: # otherwise the data changed while rendering
+                self.entries[key] = (now+self.ttl, page)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+        return page
+
+page_cache = PageCache(PAGE_CACHE_SIZE, PAGE_CACHE_TTL)
+
+PAGE_GZIP_LEVEL = 9
+PAGE_BROTLI_QUALITY = 11 # slow (~0.2s for the past page), but paid once per data version
+PAGE_ENCODINGS = ['br', 'gzip'] if brotli else ['gzip'] # in order of preference
+
+def accepted_encodings():
+    """Content codings the client accepts, per Accept-Encoding."""
+    return {e.value.lower() for e in cherrypy.request.headers.elements('Accept-Encoding') if e.qvalue > 0}
+
+def page_encoding():
+    """The coding in which a cached page is sent to this client, None for identity."""
+    accepted = accepted_encodings()
+    return next((e for e in PAGE_ENCODINGS if e in accepted), None)
+
+class CompressedPage:
+    """A rendered page, kept as utf-8 along with its compressed encodings.
+
+    Each encoding is made on first use, so a page is compressed at most once
+    per encoding for as long as it stays in `page_cache`."""
+    def __init__(self, text):
+        self.encodings = {None: text.encode('utf-8')}
+
+    def encoded(self, encoding):
+        body = self.encodings.get(encoding)
+        if body is None: # two threads may race here, both produce the same bytes
+            identity = self.encodings[None]
+            with timed('compress', encoding):
+                if encoding == 'br':
+                    body = brotli.compress(identity, quality=PAGE_BROTLI_QUALITY)
+                else:
+                    body = gzip.compress(identity, PAGE_GZIP_LEVEL, mtime=0)
+            self.encodings[encoding] = body
+        return body
+
+def render_cached(self, f, args=(), kwargs={}):
+    """The result of the handler `f` from `page_cache`, as a `CompressedPage` if it is HTML."""
+    def render():
+        page = f(self, *args, **kwargs)
+        return CompressedPage(page) if isinstance(page, str) else page
+    key = (type(self).__name__, f.__name__, args, tuple(sorted((k, repr(v)) for k, v in kwargs.items())))
+    return page_cache.get(key, render)
+
+def cached_page(f):
+    """Serve the decorated HTML handler from `page_cache`, compressed according to Accept-Encoding (with the compressed bytes cached next to the page)."""
+    @functools.wraps(f)
+    def wrapper(self, *args, **kwargs):
+        page = render_cached(self, f, args, kwargs)
+        if not isinstance(page, CompressedPage):
+            return page
+        encoding = page_encoding()
+        headers = cherrypy.response.headers
+        headers['Vary'] = 'Accept-Encoding'
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return page.encoded(encoding)
+    wrapper.compressed = True
+    return wrapper
+
+def cached_json(f):
+    """Serve the decorated `json_out` handler from `page_cache`, `json_out` encodes the result on every request."""
+    @functools.wraps(f)
+    def wrapper(self, *args, **kwargs):
+        return render_cached(self, f, args, kwargs)
+    return wrapper
 
 def dict_factory(cursor, row): # TODO use this everywhere
     d = {}
@@ -77,8 +567,7 @@ def dict_factory(cursor, row): # TODO use this everywhere
         d[col[0]] = row[idx]
     return d
 
-def conf(k):
-    v, vtype = next(sqlite3.connect(os.path.join(file_dir,CONF_FILENAME)).execute('SELECT value, valuetype FROM config WHERE key=?',(k,)))
+def parse_conf(v, vtype):
     if vtype=='str':
         return v
     elif vtype=='str[]':
@@ -92,55 +581,398 @@ def conf(k):
     else:
         raise ValueError('Unknown Value Type')
 
+CONFIG_PRIVATE_KEYS = re.compile(r'pass$|secret|token|key$|^twitter\.', re.IGNORECASE) # credentials, never shown on a page and rewritten by the OAuth flows
+
+class ConfigSnapshot:
+    """Typed in-memory copy of the config table.
+
+    The table is read once and lookups are served from memory. Writes done
+    through `updateconf`, `insertconf` and `Admin.update` call `reload`, and
+    edits made outside of the process (e.g. with the sqlite3 cli) are noticed
+    by watching the mtime and size of the file. `digest` and `modified` only
+    follow the keys that can change a page (not `CONFIG_PRIVATE_KEYS`), and
+    the listeners are only called when those change."""
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.values = {}
+        self.stamp = None
+        self.version = 0
+        self.digest = None
+        self.modified = None # time of the last change to the digest
+        self.listeners = []
+
+    def file_stamp(self):
+        st = os.stat(self.filename)
+        return st.st_mtime_ns, st.st_size
+
+    def reload(self):
+        with self.lock:
+            stamp = self.file_stamp() # taken before reading, so a concurrent write triggers another reload
+            c = sqlite3.connect(self.filename)
+            try:
+                rows = c.execute('SELECT key, value, valuetype FROM config').fetchall()
+            finally:
+                c.close()
+            digest = hashlib.sha1(repr(sorted(r for r in rows if not CONFIG_PRIVATE_KEYS.search(r[0]))).encode()).hexdigest()
+            changed = digest != self.digest
+            if changed:
+                self.digest = digest
+                self.modified = stamp[0]/1e9
+            values = {}
+            for k, v, vtype in rows:
+                try:
+                    values[k] = parse_conf(v, vtype)
+                except ValueError as e: # raised on lookup, as it would be without the snapshot
+                    values[k] = e
+            self.values = values # swapped in one step, readers never see a half-loaded snapshot
+            self.stamp = stamp
+            self.version += 1
+        if changed:
+            for f in self.listeners:
+                f()
+
+    def refresh(self):
+        """Reload if the file changed since it was last read."""
+        if self.file_stamp() != self.stamp:
+            self.reload()
+
+    def get(self, k):
+        self.refresh()
+        v = self.values[k]
+        if isinstance(v, ValueError):
+            raise v
+        if isinstance(v, list):
+            return list(v)
+        return v
+
+config = ConfigSnapshot(os.path.join(file_dir,CONF_FILENAME))
+
+_nodefault = object()
+def conf(k, default=_nodefault):
+    """Look up a config value, with a `default` for keys that older config files do not have."""
+    with timed('conf'):
+        try:
+            return config.get(k)
+        except KeyError:
+            if default is _nodefault:
+                raise
+            return default
+
 def updateconf(k,v):
     conn = sqlite3.connect(os.path.join(file_dir,CONF_FILENAME))
     with conn:
         c = conn.cursor()
         c.execute('UPDATE config SET value=? WHERE key=?',(v,k))
+    config.reload()
 
 def insertconf(k, v, helpstr='', valuetype='str'):
     conn = sqlite3.connect(os.path.join(file_dir,CONF_FILENAME))
     with conn:
         c = conn.cursor()
         c.execute('INSERT INTO config (value, valuetype, key, help) VALUES (?,?,?,?)',(v,valuetype,k,helpstr))
+    config.reload()
+
+def template_files():
+    """The templates and the static manifest, which decides the asset URLs in the rendered pages."""
+    return sorted(glob.glob(os.path.join(file_dir,'templates','*.html'))) + glob.glob(os.path.join(file_dir,'static_build','manifest.json'))
+
+def templates_digest():
+    h = hashlib.sha1()
+    for f in template_files():
+        with open(f,'rb') as fh:
+            h.update(fh.read())
+    return h.hexdigest()
+
+TEMPLATES_DIGEST = templates_digest()
+TEMPLATES_MTIME = max(os.path.getmtime(f) for f in template_files())
+
+def conditional(window=None):
+    """Set ETag and Last-Modified on the decorated handler and answer 304 without rendering when they match.
+
+    The validators are built from the version and modification time of the
+    `events` table, the templates and the config. `window`, if given,
+    returns the (local) time at which the set of talks shown on the page
+    last changed because of the clock alone, e.g. a talk becoming past."""
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(self, *args, **kwargs):
+            with conn() as c:
+                version, modified = c.execute("SELECT version, modified FROM data_versions WHERE name='events'").fetchone()
+            shifted = window() if window else None
+            page_cache.observe(version, window, shifted) # so the page served with this ETag is rendered from this version and window
+            config.refresh()
+            lastmod = max(calendar.timegm(modified.timetuple()), config.modified, TEMPLATES_MTIME)
+            tag = [type(self).__name__, f.__name__, version, TEMPLATES_DIGEST, config.digest]
+            headers = cherrypy.response.headers
+            if getattr(f, 'compressed', False): # each encoding is a different representation, with its own ETag
+                tag.append(page_encoding())
+                headers['Vary'] = 'Accept-Encoding'
+            if window:
+                tag.append(shifted)
+                if shifted:
+                    lastmod = max(lastmod, time.mktime(shifted.timetuple()))
+            headers['ETag'] = '"%s"'%hashlib.sha1(repr(tag).encode()).hexdigest()
+            headers['Last-Modified'] = httputil.HTTPDate(lastmod)
+            headers['Cache-Control'] = 'private, no-cache' if cherrypy.request.login else 'no-cache'
+            cptools.validate_etags()
+            if 'If-None-Match' not in cherrypy.request.headers: # If-Modified-Since is only a fallback for clients without ETags
+                cptools.validate_since()
+            return f(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+def upcoming_window():
+    """The time the oldest talk left the front page."""
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=2)
+    with conn() as c:
+        last = c.execute('SELECT date FROM events WHERE warmup=0 AND date<=? ORDER BY date DESC LIMIT 1', (cutoff,)).fetchone()
+    return last[0] + datetime.timedelta(days=2) if last else None
 
-def parsedates(dates): # TODO this should be automatically done as a registered converter
-    return [eval(d) for d in dates.split('|')] # TODO better parsing... actually better storing of array of dates too
+def past_window():
+    """The time the most recent talk became a past talk."""
+    with conn() as c:
+        last = c.execute('SELECT date FROM events WHERE warmup=0 AND date<? ORDER BY date DESC LIMIT 1', (datetime.datetime.now(),)).fetchone()
+    return last[0] if last else None
+
+class TimedTemplate(jinja2.Template):
+    def render(self, *args, **kwargs):
+        with timed('render', self.name):
+            return super().render(*args, **kwargs)
+
+TEMPLATE_CACHE = os.path.join(file_dir, FOLDER_LOCATION, 'jinja_cache') # compiled templates, kept across restarts
 
-templates = jinja2.Environment(loader=jinja2.FileSystemLoader(searchpath=os.path.join(file_dir,'templates/')))
-templates.globals['EVENT_NAME'] = conf('event.name')
-templates.globals['DESCRIPTION'] = conf('event.description')
-templates.globals['URL'] = conf('server.url')
-templates.globals['KEYWORDS'] = conf('event.keywords')
-templates.globals['TZ'] = conf('server.tzlong')
+os.makedirs(TEMPLATE_CACHE, exist_ok=True)
+templates = jinja2.Environment(loader=jinja2.FileSystemLoader(searchpath=os.path.join(file_dir,'templates/')),
+                               bytecode_cache=jinja2.FileSystemBytecodeCache(TEMPLATE_CACHE))
+templates.template_class = TimedTemplate
 
+STATIC_BUILD = os.path.join(file_dir, 'static_build') # written by build_static.py
+STATIC_MAX_AGE = 365*24*3600 # seconds, fingerprinted files never change
+STATIC_ENCODINGS = [('br', '.br'), ('gzip', '.gz')] # in order of preference
 
-def send_email(text_content, html_content, emailaddr, subject, pngbytes_cids=[], text_file_att=[], cc=[]):
-    log.debug('attempting to send email "%s" <%s>'%(subject, emailaddr))
+def load_static_manifest():
+    """The map from names in static/ to their fingerprinted names, and the precompressed encodings of each fingerprinted file."""
+    try:
+        with open(os.path.join(STATIC_BUILD, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        log.warning('static files are served without fingerprints, run build_static.py')
+        return {}, {}
+    assets = {target: [(encoding, suffix) for encoding, suffix in STATIC_ENCODINGS if os.path.exists(os.path.join(STATIC_BUILD, target+suffix))]
+              for target in manifest.values()}
+    return manifest, assets
+
+static_manifest, static_assets = load_static_manifest()
+
+def static_url(name):
+    """The URL of a file in static/, fingerprinted if build_static.py was run."""
+    return '/static/'+static_manifest.get(name, name)
+
+def serve_asset():
+    """Serve fingerprinted files from static_build/, precompressed according to Accept-Encoding. Other files are left to `tools.staticdir`."""
+    request = cherrypy.request
+    name = request.path_info[len('/static/'):]
+    encodings = static_assets.get(name)
+    if encodings is None:
+        return False
+    accepted = accepted_encodings()
+    encoding, suffix = next(((e, s) for e, s in encodings if e in accepted), (None, ''))
+    headers = cherrypy.response.headers
+    headers['Cache-Control'] = 'public, max-age=%d, immutable'%STATIC_MAX_AGE
+    headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    serve_file(os.path.join(STATIC_BUILD, name+suffix), content_type=mimetypes.guess_type(name)[0] or 'application/octet-stream')
+    request.handler = None
+    return True
+
+cherrypy.tools.assets = cherrypy.Tool('before_handler', serve_asset)
+
+def compile_templates():
+    """Load every template, so that none is compiled while serving a request and the bytecode cache is filled for the next start."""
+    for name in templates.list_templates():
+        try:
+            templates.get_template(name)
+        except Exception as e:
+            log.error('Could not compile the template %s due to %s'%(name, e))
+def update_template_globals():
+    templates.globals['EVENT_NAME'] = conf('event.name')
+    templates.globals['DESCRIPTION'] = conf('event.description')
+    templates.globals['URL'] = conf('server.url')
+    templates.globals['KEYWORDS'] = conf('event.keywords')
+    templates.globals['TZ'] = conf('server.tzlong')
+templates.globals['static_url'] = static_url
+update_template_globals()
+config.listeners.append(update_template_globals)
+config.listeners.append(page_cache.invalidate)
+
+
+def send_email(text_content, html_content, emailaddr, subject, pngbytes_cids=[], text_file_att=[], cc=[], announce=None):
+    """Queue an email in the outbox, it is sent in the background by `outbox`. Returns whether it was queued.
+
+    `announce` is a `(date, warmup, level)` tuple for talk announcements,
+    `events.announced` is set to `level` once all of them are delivered."""
+    log.debug('queueing email "%s" <%s>'%(subject, emailaddr))
     try:
         msg = email.message.EmailMessage()
         msg.set_content(text_content)
         msg['Subject'] = subject
         msg['From'] = email.headerregistry.Address(conf('email.from_display'), conf('email.from_user'), conf('email.from'))
         msg['To'] = emailaddr
-        msg['Bcc'] = ','.join(conf('email.cc')+cc+[conf('sysadmin.email')])
+        msg['Bcc'] = ','.join(_ for _ in conf('email.cc')+cc+[conf('sysadmin.email')] if _) # e.g. talks without a host_email
 
         msg.add_alternative(html_content, subtype='html')
         for pngbytes, cid in pngbytes_cids:
             msg.get_payload()[1].add_related(pngbytes, 'image', 'png', cid=cid)
         for fname, ftext, subtype in text_file_att:
             msg.add_attachment(ftext.encode('utf8'), 'text', subtype, filename=fname)
-        
-        username = conf('email.SMTPuser')
-        password = conf('email.SMTPpass')
-        server = smtplib.SMTP(socket.gethostbyname(conf('email.SMTPhost'))+':'+conf('email.SMTPport')) # XXX workaround for IPv6 bugs with Digital Ocean
+
+        outbox.enqueue(msg, announce)
+        return True
+    except Exception as e:
+        log.error('failed to queue email "%s" <%s> due to %s'%(subject, emailaddr, e))
+        return False
+
+def smtp_connect():
+    with timed('smtp', 'connect'):
+        server = smtplib.SMTP(socket.gethostbyname(conf('email.SMTPhost'))+':'+conf('email.SMTPport'), timeout=SMTP_TIMEOUT) # XXX workaround for IPv6 bugs with Digital Ocean
         server.ehlo()
         server.starttls()
-        server.login(username,password)
+        server.login(conf('email.SMTPuser'),conf('email.SMTPpass'))
+    return server
+
+def smtp_send(server, msg):
+    with timed('smtp', 'send'):
         server.send_message(msg)
+
+OUTBOX_WORKERS = 2
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_BACKOFF = 60 # seconds before the first retry, doubled after every failed attempt
+OUTBOX_POLL = 30 # seconds between checks for messages that are due for a retry
+SMTP_TIMEOUT = 30
+SMTP_IDLE_TIMEOUT = 120 # seconds before an unused connection is closed, servers drop idle clients after a few minutes anyway
+
+class EmailOutbox:
+    """Sender threads draining the `outbox` table over long-lived SMTP connections.
+
+    Failed messages are retried with exponential backoff and marked as
+    `dead` after `OUTBOX_MAX_ATTEMPTS`, they can be requeued from the admin
+    panel."""
+    def __init__(self, workers):
+        self.workers = workers
+        self.wakeup = threading.Condition()
+        self.running = False
+        self.threads = []
+
+    def start(self):
+        with conn() as c: # messages claimed before a restart
+            c.execute("UPDATE outbox SET status='pending' WHERE status='sending'")
+        self.running = True
+        self.threads = [threading.Thread(target=self.work, name='outbox-%d'%i, daemon=True) for i in range(self.workers)]
+        for t in self.threads:
+            t.start()
+
+    def stop(self):
+        self.running = False
+        with self.wakeup:
+            self.wakeup.notify_all()
+        for t in self.threads:
+            t.join()
+
+    def enqueue(self, msg, announce=None):
+        date, warmup, level = announce or (None, None, None)
+        now = datetime.datetime.now()
+        with conn() as c:
+            c.execute('INSERT INTO outbox (created, subject, recipient, message, next_attempt, announce_date, announce_warmup, announce_level) VALUES (?,?,?,?,?,?,?,?)',
+                      (now, msg['Subject'], msg['To'], msg.as_bytes(), now, date, warmup, level))
+        with self.wakeup:
+            self.wakeup.notify()
+
+    def requeue(self, id):
+        with conn() as c:
+            c.execute("UPDATE outbox SET status='pending', attempts=0, next_attempt=? WHERE id=? AND status='dead'", (datetime.datetime.now(), id))
+        with self.wakeup:
+            self.wakeup.notify()
+
+    def claim(self):
+        """Mark the next due message as being sent by this thread and return it."""
+        with conn(d=True) as c:
+            while True:
+                row = c.execute("SELECT * FROM outbox WHERE status='pending' AND next_attempt<=? ORDER BY next_attempt LIMIT 1", (datetime.datetime.now(),)).fetchone()
+                if row is None:
+                    return None
+                if c.execute("UPDATE outbox SET status='sending', attempts=attempts+1 WHERE id=? AND status='pending'", (row['id'],)).rowcount:
+                    row['attempts'] += 1
+                    return row
+
+    def sent(self, row):
+        with conn() as c:
+            c.execute("UPDATE outbox SET status='sent', sent=? WHERE id=?", (datetime.datetime.now(), row['id']))
+            if row['announce_level'] is not None:
+                c.execute("""UPDATE events SET announced=MAX(announced, ?) WHERE date=? AND warmup=? AND NOT EXISTS
+                             (SELECT 1 FROM outbox WHERE announce_date=? AND announce_warmup=? AND announce_level=? AND status!='sent')""",
+                          (row['announce_level'], row['announce_date'], row['announce_warmup'],
+                           row['announce_date'], row['announce_warmup'], row['announce_level']))
+
+    def failed(self, row, e):
+        if row['attempts'] >= OUTBOX_MAX_ATTEMPTS:
+            log.error('giving up on email %s "%s" <%s> due to %s'%(row['id'], row['subject'], row['recipient'], e))
+            status, next_attempt = 'dead', row['next_attempt']
+        else:
+            log.warning('failed to send email %s "%s" <%s> due to %s, retrying'%(row['id'], row['subject'], row['recipient'], e))
+            status, next_attempt = 'pending', datetime.datetime.now() + datetime.timedelta(seconds=OUTBOX_BACKOFF*2**(row['attempts']-1))
+        with conn() as c:
+            c.execute('UPDATE outbox SET status=?, next_attempt=?, last_error=? WHERE id=?', (status, next_attempt, str(e), row['id']))
+
+    def work(self):
+        server = None
+        last_used = time.monotonic()
+        while self.running:
+            try:
+                row = self.claim()
+            except Exception as e:
+                log.error('failed to read the email outbox due to %s'%e)
+                row = None
+            if row is None:
+                if server and time.monotonic()-last_used > SMTP_IDLE_TIMEOUT:
+                    smtp_quit(server)
+                    server = None
+                with self.wakeup:
+                    self.wakeup.wait(OUTBOX_POLL)
+                continue
+            msg = email.message_from_bytes(row['message'], policy=email.policy.default)
+            try:
+                with tracer.trace('outbox %s'%row['id']):
+                    if server is None:
+                        server = smtp_connect()
+                    try:
+                        smtp_send(server, msg)
+                    except smtplib.SMTPServerDisconnected: # the kept-alive connection was closed by the server
+                        server = smtp_connect()
+                        smtp_send(server, msg)
+                    log.debug('sent email %s "%s" <%s>'%(row['id'], row['subject'], row['recipient']))
+                    self.sent(row)
+            except Exception as e:
+                if server:
+                    smtp_quit(server)
+                    server = None
+                self.failed(row, e)
+            last_used = time.monotonic()
+        if server:
+            smtp_quit(server)
+
+def smtp_quit(server):
+    try:
         server.quit()
-    except Exception as e:
-        log.error('failed to send email "%s" <%s> due to %s'%(subject, emailaddr, e))
+    except Exception:
+        server.close()
+
+outbox = EmailOutbox(OUTBOX_WORKERS)
+
+def twitter_client(keys):
+    from twitter import Twitter, TWITTER_API_URL, TWITTER_UPLOAD_URL
+    return Twitter(keys, api_url=conf('twitter.apiurl', TWITTER_API_URL), upload_url=conf('twitter.uploadurl', TWITTER_UPLOAD_URL))
 
 def send_tweet(text_content, pngbytes=None):
     try:
@@ -156,15 +988,17 @@ def send_tweet(text_content, pngbytes=None):
                 return
             twitterkeys[key] = conf("twitter." + key)
 
-        twitter = Twitter(twitterkeys)
+        twitter = twitter_client(twitterkeys)
 
         media_id = None
         if pngbytes:
-            media_id = twitter.upload_media(pngbytes, log=log)
+            with timed('twitter', 'upload'):
+                media_id = twitter.upload_image(pngbytes, log=log)
             if media_id is None: # abort tweeting if media upload fails rather than tweet without media (error logs will happen in the upload_media function so logging here would be redundant)
                 return
 
-        errorstring = twitter.tweet(text_content, media_id, log=log)
+        with timed('twitter', 'tweet'):
+            errorstring = twitter.tweet(text_content, media_id, log=log)
         return errorstring
     except Exception as e:
         log.error(f"sending tweet failed due to exception {e}")
@@ -190,69 +1024,80 @@ def ZOOM_TEMPLATE():
 
 # Etherpad
 
-etherpad = py_etherpad.EtherpadLiteClient(apiKey=conf("etherpad.apikey"),baseUrl=conf("etherpad.url")+'/api')
+@functools.lru_cache(maxsize=None)
+def etherpad_client():
+    """The Etherpad API client, created on first use."""
+    import py_etherpad
+    class TimedEtherpadClient(py_etherpad.EtherpadLiteClient):
+        def call(self, function, *args, **kwargs):
+            with timed('etherpad', function):
+                return super().call(function, *args, **kwargs)
+    return TimedEtherpadClient(apiKey=conf("etherpad.apikey"),baseUrl=conf("etherpad.url")+'/api')
 
 # Scheduled Events
 
 def check_upcoming_talks_and_email():
-    try:
-        log.debug('Checking whether we need to send an email announcement for talks')
-        for prev_announcements, days_in_advance_min, days_in_advance_max in [(1, 1, 2), (0, 1, 6)]:
-            with conn(d=True) as c:
-                upcoming_talks = c.execute(f"SELECT * FROM events WHERE announced<={prev_announcements} AND date>date('now','+{days_in_advance_min} day') AND date<date('now','+{days_in_advance_max} day')").fetchall()
-                all_upcoming_talks = list(c.execute("SELECT * FROM events WHERE announced=0 AND date>date('now') AND date<date('now','+60 day')"))
-            for r in upcoming_talks:
-                event = conf('event.name')
-                datestr = r['date'].strftime('%b %-d')
-                subject = f"Upcoming talk {datestr} - {r['title']} by {r['speaker']}"
-                priv_subject = f"Private Schedule - {r['title']} by {r['speaker']}"
-                upcoming_url = 'https://'+conf('server.url')
-                if conf('server.alluser') and conf('server.publicfrontpageoverride'):
-                    public_url = upcoming_url
-                else:
-                    public_url = 'https://'+conf('server.url')+'/event/'+urllib.parse.quote(str(r['date']))+'/'+str(r['warmup'])
-                if all_upcoming_talks:
-                    _html = "".join([f"<p>{t['date']} | {t['title']} - {t['speaker']}</p>" for t in all_upcoming_talks if t!=r])
-                    _plain = "\n".join([f"{t['date']} | {t['title']} - {t['speaker']}" for t in all_upcoming_talks if t!=r])
-                    future_talks_html = f"<div><h2>Future talks (<a href=\"{upcoming_url}\">listed at {upcoming_url}</a>)</h2>{_html}</div>"
-                    future_talks_plain = f"\n\nFuture talks listed at {upcoming_url}\n{_plain}"
-                else:
-                    future_talks_html = f"<div><a href=\"{upcoming_url}\">{upcoming_url}</div>"
-                    future_talks_plain = f"\n\n{upcoming_url}"
-                priv_signup_html = f"<div><h2>Private schedule</h2><a href=\"{r['sched_link']}\">{r['sched_link']}</a></div><div><strong>{conf('event.emailfooter')}</strong></div>"
-                priv_signup_plain = f"\nPrivate meeting signup: {r['sched_link']}\n{conf('event.emailfooter')}"
-                html = f"""
-                <strong>{event} - {datestr}</strong>
-                <h2>{r['title']}</h2>
-                <h3>{r['speaker']} - {r['affiliation']}</h3>
-                <div><p>Abstract: </p><p style=\"white-space:pre-wrap;\">{r['abstract']}</p></div>
-                <div><p>Bio:</p><p style=\"white-space:pre-wrap;\">{r['bio']}</p></div><div></div>
-                <div>
-                <p><strong>Location and Video Conference link</strong>: <a href=\"{public_url}\">{public_url}</a></p>
-                <p>Timezone: {conf('server.tzlong')}</p>
-                </div>"""
-                plain = f"{event} - {datestr}\n{r['title']}\n{r['speaker']} - {r['affiliation']}\n\nAbstract: {r['abstract']}\n\nBio: {r['bio']}\n\nLocation & Video Conference link: {public_url}\n\nTimezone: {conf('server.tzlong')}"
-                speaker_email = r['email']
-                host_email = r['host_email']
-                mailing_list_email = conf("email.mailing_list")
-                priv_mailing_list_email = conf("email.priv_mailing_list")
-                event_name = f"{r['title']} by {r['speaker']}"
-                ics_file = make_ics_file(subject, plain, r['date'], public_url)
-                send_email(plain+future_talks_plain, html+future_talks_html, mailing_list_email, subject, cc=[speaker_email, host_email], text_file_att=[('calendar.ics',ics_file,'calendar')])
-                send_email(plain+priv_signup_plain+future_talks_plain, html+priv_signup_html+future_talks_html, priv_mailing_list_email, priv_subject, cc=[speaker_email, host_email], text_file_att=[('calendar.ics',ics_file,'calendar')])
-
-
-                # Send a Tweet
-                tweettext = f'Glad to host {r["speaker"]} of {r["affiliation"]} for an OQE seminar, titled "{r["title"]}".\n\n{public_url}'
-                send_tweet(tweettext)
-
-                with conn() as c: # TODO do not send this if the email failed to send
-                    c.execute(f'UPDATE events SET announced={prev_announcements+1} WHERE date=? AND warmup=?',
-                              (r['date'],r['warmup']))
-    except Exception as e:
-        log.error('Failure in the email annoucements scheduled job due to %s'%e)
+    log.debug('Checking whether we need to send an email announcement for talks')
+    failed = []
+    for prev_announcements, days_in_advance_min, days_in_advance_max in [(1, 1, 2), (0, 1, 6)]:
+        level = prev_announcements+1
+        with conn(d=True) as c: # talks with queued announcements are skipped, `announced` is only raised once they are delivered
+            upcoming_talks = c.execute(f"""SELECT * FROM events WHERE announced<={prev_announcements} AND date>date('now','+{days_in_advance_min} day') AND date<date('now','+{days_in_advance_max} day')
+                                           AND NOT EXISTS (SELECT 1 FROM outbox WHERE announce_date=events.date AND announce_warmup=events.warmup AND announce_level>={level})""").fetchall()
+            all_upcoming_talks = list(c.execute("SELECT * FROM events WHERE announced=0 AND date>date('now') AND date<date('now','+60 day')"))
+        for r in upcoming_talks:
+            event = conf('event.name')
+            datestr = r['date'].strftime('%b %-d')
+            subject = f"Upcoming talk {datestr} - {r['title']} by {r['speaker']}"
+            priv_subject = f"Private Schedule - {r['title']} by {r['speaker']}"
+            upcoming_url = 'https://'+conf('server.url')
+            if conf('server.alluser') and conf('server.publicfrontpageoverride'):
+                public_url = upcoming_url
+            else:
+                public_url = 'https://'+conf('server.url')+'/event/'+urllib.parse.quote(str(r['date']))+'/'+str(r['warmup'])
+            if all_upcoming_talks:
+                _html = "".join([f"<p>{t['date']} | {t['title']} - {t['speaker']}</p>" for t in all_upcoming_talks if t!=r])
+                _plain = "\n".join([f"{t['date']} | {t['title']} - {t['speaker']}" for t in all_upcoming_talks if t!=r])
+                future_talks_html = f"<div><h2>Future talks (<a href=\"{upcoming_url}\">listed at {upcoming_url}</a>)</h2>{_html}</div>"
+                future_talks_plain = f"\n\nFuture talks listed at {upcoming_url}\n{_plain}"
+            else:
+                future_talks_html = f"<div><a href=\"{upcoming_url}\">{upcoming_url}</div>"
+                future_talks_plain = f"\n\n{upcoming_url}"
+            priv_signup_html = f"<div><h2>Private schedule</h2><a href=\"{r['sched_link']}\">{r['sched_link']}</a></div><div><strong>{conf('event.emailfooter')}</strong></div>"
+            priv_signup_plain = f"\nPrivate meeting signup: {r['sched_link']}\n{conf('event.emailfooter')}"
+            html = f"""
+            <strong>{event} - {datestr}</strong>
+            <h2>{r['title']}</h2>
+            <h3>{r['speaker']} - {r['affiliation']}</h3>
+            <div><p>Abstract: </p><p style=\"white-space:pre-wrap;\">{r['abstract']}</p></div>
+            <div><p>Bio:</p><p style=\"white-space:pre-wrap;\">{r['bio']}</p></div><div></div>
+            <div>
+            <p><strong>Location and Video Conference link</strong>: <a href=\"{public_url}\">{public_url}</a></p>
+            <p>Timezone: {conf('server.tzlong')}</p>
+            </div>"""
+            plain = f"{event} - {datestr}\n{r['title']}\n{r['speaker']} - {r['affiliation']}\n\nAbstract: {r['abstract']}\n\nBio: {r['bio']}\n\nLocation & Video Conference link: {public_url}\n\nTimezone: {conf('server.tzlong')}"
+            speaker_email = r['email']
+            host_email = r['host_email']
+            mailing_list_email = conf("email.mailing_list")
+            priv_mailing_list_email = conf("email.priv_mailing_list")
+            event_name = f"{r['title']} by {r['speaker']}"
+            ics_file = make_ics_file(subject, plain, r['date'], public_url)
+            announce = (r['date'], r['warmup'], level)
+            queued = [send_email(plain+future_talks_plain, html+future_talks_html, mailing_list_email, subject, cc=[speaker_email, host_email], text_file_att=[('calendar.ics',ics_file,'calendar')], announce=announce),
+                      send_email(plain+priv_signup_plain+future_talks_plain, html+priv_signup_html+future_talks_html, priv_mailing_list_email, priv_subject, cc=[speaker_email, host_email], text_file_att=[('calendar.ics',ics_file,'calendar')], announce=announce)]
+            if not all(queued): # no tweet, the talk is announced again on the next run (if neither email was queued) and the tweet with it
+                failed.append(event_name)
+                continue
+
+            # Send a Tweet
+            tweettext = f'Glad to host {r["speaker"]} of {r["affiliation"]} for an OQE seminar, titled "{r["title"]}".\n\n{public_url}'
+            send_tweet(tweettext)
+    if failed:
+        raise Exception('could not queue the announcements of %s'%', '.join(failed))
 
 def make_ics_file(name, description, begin, url):
+    import ics
+    import pytz
     c = ics.Calendar(creator="nonlocally")
     begin = pytz.timezone(conf('server.tzlong')).localize(begin)
     e = ics.Event(name=name,description=description,begin=begin,end=begin+datetime.timedelta(hours=1),location=url,url=url,uid=str(uuid.uuid3(uuid.NAMESPACE_URL,url)))
@@ -260,85 +1105,526 @@ def make_ics_file(name, description, begin, url):
     return c.serialize()
 
 def check_recordings_and_download():
-    try:
-        log.debug('Checking whether we have talks to download recordings for')
+    log.debug('Checking whether we have talks to download recordings for')
+    with conn() as c:
+        c.execute("""INSERT INTO recording_jobs (date, warmup, next_attempt, updated)
+                     SELECT date, warmup, ?, ? FROM events WHERE recording_processed=0 AND recording_consent=1 AND date<date('now','-1 day')
+                     AND NOT EXISTS (SELECT 1 FROM recording_jobs WHERE recording_jobs.date=events.date AND recording_jobs.warmup=events.warmup)""",
+                  (datetime.datetime.now(), datetime.datetime.now()))
+    recordings.notify()
+
+RECORDING_FOLDER = FOLDER_LOCATION+"/recordings/"+SEMINAR_SERIES # TODO this should be in config and the trailing / should be normalized conf("zoom.recdownloads")
+RECORDING_STAGE_WORKERS = {'metadata': 2, 'download': 1, 'verify': 2, 'transcode': 1}
+RECORDING_MAX_ATTEMPTS = 8
+RECORDING_BACKOFF = 600 # seconds before retrying a failed stage, doubled after every failure
+RECORDING_RETRY_STAGE = {'verify': 'download'} # stages that are retried from an earlier one, a failed verification resumes the download
+RECORDING_POLL = 300 # seconds between checks for jobs that are due for a retry
+RECORDING_CHUNK = 1024*1024
+RECORDING_PROGRESS_INTERVAL = 5 # seconds between progress updates in the database during downloads
+HLS_SEGMENT_TIME = 10
+HLS_COPY_CODECS = {'video': {'h264'}, 'audio': {'aac', 'mp3'}} # playable in HLS as they are
+HLS_LADDER = ['1080:3000k', '720:1500k', '360:500k'] # height:video bitrate of each rendition, overridden by conf('zoom.hlsladder')
+HLS_AUDIO_KBPS = 96
+HLS_POSTER_TIME = 60 # seconds into the talk, or a tenth of it for short recordings
+HLS_POSTER_HEIGHT = 720
+
+def recording_name(date, warmup):
+    return str(date).replace(" ","_").replace(":","_") + '-' + str(int(warmup))
+
+class RecordingFailed(Exception):
+    """A failure that retrying will not fix."""
+
+class RecordingJobs:
+    """Download and transcode pipeline for talk recordings, persisted in the `recording_jobs` table.
+
+    Every stage (metadata, download, verify, transcode) has its own worker
+    threads, so a long transcode does not hold back other downloads and
+    at most `RECORDING_STAGE_WORKERS[stage]` jobs are in a stage at once.
+    A job moves to the next stage when one succeeds, failures are retried
+    with exponential backoff and the job is marked as failed after
+    `RECORDING_MAX_ATTEMPTS`. `recording_processed` is only set once the HLS
+    playlist exists."""
+    stages = ['metadata', 'download', 'verify', 'transcode']
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.wakeup = threading.Condition()
+        self.running = False
+        self.threads = []
+        self.processes = set()
+
+    def start(self):
+        with conn() as c: # jobs interrupted by a restart
+            c.execute("UPDATE recording_jobs SET status='waiting' WHERE status='running'")
+        self.running = True
+        self.threads = [threading.Thread(target=self.work, args=(stage,), name='recordings-%s-%d'%(stage, i), daemon=True)
+                        for stage in self.stages for i in range(self.workers[stage])]
+        for t in self.threads:
+            t.start()
+
+    def stop(self):
+        self.running = False
+        for p in list(self.processes):
+            p.terminate()
+        self.notify()
+        for t in self.threads:
+            t.join(timeout=10)
+
+    def notify(self):
+        with self.wakeup:
+            self.wakeup.notify_all()
+
+    def retry(self, date, warmup):
+        with conn() as c:
+            c.execute("UPDATE recording_jobs SET stage='metadata', status='waiting', attempts=0, next_attempt=?, updated=? WHERE date=? AND warmup=? AND stage='failed'",
+                      (datetime.datetime.now(), datetime.datetime.now(), date, warmup))
+        self.notify()
+
+    def claim(self, stage):
         with conn(d=True) as c:
-            recorded_talks = c.execute("SELECT * FROM events WHERE recording_processed=0 AND recording_consent=1 AND date<date('now','-1 day') ORDER BY date DESC").fetchall()
-        for r in recorded_talks: # TODO this should be a function that can also be called from the admin panel
-            event = conf('event.name')
-            config = {"recording_authentication": False}
-            if r['conf_link']:
-                meetingid = r['conf_link'].split('/')[-1]
-            else:
-                log.error("the conf_link for %s is missing and we can not download anything"%r['date'])
-            log.debug(f"looking up zoom recording for {r['date']} {r['warmup']}")
-            Zoom.patch('/meetings/%s/recordings/settings'%meetingid, data=config)
-            rec = Zoom.get('/meetings/%s/recordings'%meetingid).json()
-            log.debug("zoom recording json: %s"%(json.dumps(rec,indent=4)))
-            rec = [r for r in rec['recording_files'] if r['recording_type'].startswith('shared_screen')]
-            rec.sort(key=lambda _:int(_['file_size']),reverse=True)
-            rec = rec[0]
-            url = rec['download_url']
-            recording_folder = FOLDER_LOCATION+"/recordings/"+SEMINAR_SERIES # TODO this should be in config and the trailing / should be normalized conf("zoom.recdownloads")
-            os.system("mkdir -p %s"%recording_folder)
-            os.system("mkdir -p %s/hls"%recording_folder)
-            recording_name = str(r["date"]).replace(" ","_").replace(":","_") + '-' + str(int(r["warmup"]))
-            hls_cmd = f"ffmpeg -i {recording_folder}/{recording_name}.mp4 -profile:v baseline -level 3.0 -start_number 0 -hls_time 10 -hls_list_size 0 -f hls {recording_folder}/hls/{recording_name}.m3u8"
-            log.debug("started downloading %s into %s/%s"%(url,recording_folder,recording_name))
-            wget_cmd = 'wget "%s?access_token=%s" -O "%s/%s.mp4"'%(url,conf('zoom.accesstoken'),recording_folder,recording_name)
-            log.debug("downloading with %s"%wget_cmd)
-            os.system(wget_cmd) # TODO raise error if wget is not installed
-            log.debug("finished downloading and now converting %s"%recording_name)
-            os.system(f'{hls_cmd} &') # TODO raise error if ffmpeg is not installed
-            log.debug("converting is now running in the background %s"%recording_name)
-            with conn() as c:
-                c.execute('UPDATE events SET recording_processed=1 WHERE date=? AND warmup=?',
-                          (r['date'],r['warmup']))
-            break # TODO add some delay so we do not download multiple files at the same time and remove this break statement
-    except Exception as e:
-        log.error('Failure in downloading recording due to %s'%e)
+            while True:
+                job = c.execute("SELECT * FROM recording_jobs WHERE stage=? AND status='waiting' AND next_attempt<=? ORDER BY date DESC LIMIT 1", (stage, datetime.datetime.now())).fetchone()
+                if job is None:
+                    return None
+                if c.execute("UPDATE recording_jobs SET status='running', updated=? WHERE date=? AND warmup=? AND status='waiting'", (datetime.datetime.now(), job['date'], job['warmup'])).rowcount:
+                    return job
+
+    def update(self, job, **kwargs):
+        kwargs['updated'] = datetime.datetime.now()
+        with conn() as c:
+            c.execute('UPDATE recording_jobs SET %s WHERE date=? AND warmup=?'%', '.join('%s=?'%k for k in kwargs),
+                      list(kwargs.values())+[job['date'], job['warmup']])
+
+    def advance(self, job, stage, **kwargs):
+        log.debug('recording %s %s moves to stage %s'%(job['date'], job['warmup'], stage))
+        self.update(job, stage=stage, status='waiting', attempts=0, next_attempt=datetime.datetime.now(), last_error=None, **kwargs)
+        self.notify()
+
+    def failed(self, job, e):
+        attempts = job['attempts']+1
+        if isinstance(e, RecordingFailed) or attempts >= RECORDING_MAX_ATTEMPTS:
+            log.error('giving up on the recording of %s %s at stage %s due to %s'%(job['date'], job['warmup'], job['stage'], e))
+            self.update(job, stage='failed', status='waiting', attempts=attempts, last_error='%s: %s'%(job['stage'], e))
+        else:
+            log.warning('stage %s of the recording of %s %s failed due to %s, retrying'%(job['stage'], job['date'], job['warmup'], e))
+            self.update(job, stage=RECORDING_RETRY_STAGE.get(job['stage'], job['stage']), status='waiting', attempts=attempts, last_error=str(e),
+                        next_attempt=datetime.datetime.now()+datetime.timedelta(seconds=RECORDING_BACKOFF*2**(attempts-1)))
+
+    def work(self, stage):
+        while self.running:
+            try:
+                job = self.claim(stage)
+            except Exception as e:
+                log.error('failed to read the recording jobs due to %s'%e)
+                job = None
+            if job is None:
+                with self.wakeup:
+                    self.wakeup.wait(RECORDING_POLL)
+                continue
+            try:
+                with tracer.trace('recording %s %s %s'%(stage, job['date'], job['warmup'])):
+                    getattr(self, stage)(job)
+            except Exception as e:
+                if self.running:
+                    self.failed(job, e)
+                else: # interrupted by a shutdown, resumed on the next start
+                    self.update(job, status='waiting')
+
+    def metadata(self, job):
+        with conn(d=True) as c:
+            r = c.execute('SELECT conf_link FROM events WHERE date=? AND warmup=?', (job['date'], job['warmup'])).fetchone()
+        if not r or not r['conf_link']:
+            raise RecordingFailed('the conf_link is missing and we can not download anything')
+        meetingid = r['conf_link'].split('/')[-1].split('?')[0]
+        log.debug(f"looking up zoom recording for {job['date']} {job['warmup']}")
+        Zoom.patch('/meetings/%s/recordings/settings'%meetingid, data={"recording_authentication": False})
+        rec = Zoom.get('/meetings/%s/recordings'%meetingid).json()
+        log.debug("zoom recording json: %s"%(json.dumps(rec,indent=4)))
+        rec = [r for r in rec.get('recording_files', []) if r['recording_type'].startswith('shared_screen')]
+        if not rec:
+            raise Exception('no shared screen recording available (yet)')
+        rec.sort(key=lambda _:int(_['file_size']),reverse=True)
+        self.advance(job, 'download', download_url=rec[0]['download_url'], file_size=int(rec[0]['file_size']))
+
+    def download(self, job):
+        os.makedirs(RECORDING_FOLDER, exist_ok=True)
+        filename = '%s/%s.mp4'%(RECORDING_FOLDER, recording_name(job['date'], job['warmup']))
+        done = os.path.getsize(filename) if os.path.exists(filename) else 0
+        if done < job['file_size']:
+            headers = {'Range': 'bytes=%d-'%done} if done else {}
+            log.debug("downloading %s into %s from byte %d"%(job['download_url'], filename, done))
+            with timed('zoom', 'download'), \
+                 zoom_client.session.get(job['download_url'], params={'access_token': zoom_client.access_token()}, headers=headers,
+                                         stream=True, timeout=ZOOM_TIMEOUT) as r:
+                r.raise_for_status()
+                if r.status_code != 206: # the server ignored the Range header
+                    done = 0
+                with open(filename, 'ab' if done else 'wb') as f:
+                    last_update = time.monotonic()
+                    for chunk in r.iter_content(RECORDING_CHUNK):
+                        if not self.running:
+                            raise Exception('interrupted')
+                        f.write(chunk)
+                        done += len(chunk)
+                        if time.monotonic()-last_update > RECORDING_PROGRESS_INTERVAL:
+                            self.update(job, bytes_done=done)
+                            last_update = time.monotonic()
+        self.advance(job, 'verify', bytes_done=done)
+
+    def verify(self, job):
+        filename = '%s/%s.mp4'%(RECORDING_FOLDER, recording_name(job['date'], job['warmup']))
+        size = os.path.getsize(filename) if os.path.exists(filename) else 0
+        if size > job['file_size']: # not a partial download that can be resumed
+            os.remove(filename)
+        if size != job['file_size']:
+            raise Exception('expected %d bytes but the download has %d'%(job['file_size'], size))
+        self.advance(job, 'transcode')
+
+    def transcode(self, job):
+        for tool in ['ffmpeg', 'ffprobe']:
+            if not shutil.which(tool):
+                raise Exception('%s is not installed'%tool)
+        name = recording_name(job['date'], job['warmup'])
+        log.debug("converting %s"%name)
+        playlist = self.encode('%s/%s.mp4'%(RECORDING_FOLDER, name), name)
+        if not os.path.exists(playlist):
+            raise Exception('ffmpeg did not produce %s'%playlist)
+        with conn() as c:
+            c.execute('UPDATE events SET recording_processed=1 WHERE date=? AND warmup=?', (job['date'], job['warmup']))
+        self.advance(job, 'done')
+
+    def probe(self, source):
+        info = json.loads(self.run(['ffprobe', '-v', 'error', '-show_streams', '-show_format', '-of', 'json', source]))
+        streams = collections.defaultdict(list)
+        for s in info['streams']:
+            streams[s['codec_type']].append(s)
+        if not streams['video']:
+            raise RecordingFailed('%s has no video stream'%source)
+        return streams['video'][0], (streams['audio'] or [None])[0], float(info['format'].get('duration', 0))
+
+    def encode(self, source, name):
+        """Write the poster and the HLS playlist `hls/name.m3u8` for `source`.
+
+        H.264/AAC recordings (what Zoom produces) are only remuxed into
+        segments. Anything else is encoded into the `zoom.hlsladder`
+        renditions, run in parallel within `zoom.transcodethreads`, and
+        `hls/name.m3u8` becomes the master playlist over them."""
+        video, audio, duration = self.probe(source)
+        os.makedirs('%s/hls'%RECORDING_FOLDER, exist_ok=True)
+        os.makedirs('%s/poster'%RECORDING_FOLDER, exist_ok=True)
+        self.run(['ffmpeg', '-y', '-ss', str(min(HLS_POSTER_TIME, duration/10)), '-i', source, '-frames:v', '1',
+                  '-vf', 'scale=-2:%d'%min(HLS_POSTER_HEIGHT, video['height']), '-q:v', '4', '%s/poster/%s.jpg'%(RECORDING_FOLDER, name)])
+        playlist = '%s/hls/%s.m3u8'%(RECORDING_FOLDER, name)
+        for f in glob.glob('%s/hls/%s[._]*'%(RECORDING_FOLDER, glob.escape(name))): # leftovers of an interrupted attempt
+            os.remove(f)
+        if video['codec_name'] in HLS_COPY_CODECS['video'] and (audio is None or audio['codec_name'] in HLS_COPY_CODECS['audio']):
+            log.debug('remuxing %s without re-encoding'%name)
+            self.run(['ffmpeg', '-y', '-i', source, '-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy']
+                     +self.hls_args('%s/hls/%s_%%d.ts'%(RECORDING_FOLDER, name))+[playlist])
+            return playlist
+        ladder = [tuple(int(_.strip().lower().rstrip('k')) for _ in r.split(':')) for r in conf('zoom.hlsladder', HLS_LADDER)]
+        ladder = [r for r in ladder if r[0] <= video['height']] or [min(ladder)] # no upscaling
+        budget = max(1, conf('zoom.transcodethreads', os.cpu_count() or 1))
+        parallel = min(budget, len(ladder))
+        threads = max(1, budget//parallel)
+        log.debug('encoding %s into %s with %d parallel encoders'%(name, ladder, parallel))
+        def rendition(r):
+            height, kbps = r
+            self.run(['ffmpeg', '-y', '-i', source, '-map', '0:v:0', '-map', '0:a:0?', '-vf', 'scale=-2:%d'%height,
+                      '-c:v', 'libx264', '-preset', 'veryfast', '-profile:v', 'main', '-b:v', '%dk'%kbps, '-maxrate', '%dk'%(kbps*1.1),
+                      '-bufsize', '%dk'%(kbps*2), '-force_key_frames', 'expr:gte(t,n_forced*%d)'%HLS_SEGMENT_TIME, '-threads', str(threads),
+                      '-c:a', 'aac', '-b:a', '%dk'%HLS_AUDIO_KBPS, '-ac', '2']
+                     +self.hls_args('%s/hls/%s_%dp_%%d.ts'%(RECORDING_FOLDER, name, height))+['%s/hls/%s_%dp.m3u8'%(RECORDING_FOLDER, name, height)])
+        with concurrent.futures.ThreadPoolExecutor(parallel) as pool:
+            for f in [pool.submit(rendition, r) for r in ladder]:
+                f.result()
+        width = lambda h: int(round(h*video['width']/video['height']/2))*2
+        with open(playlist+'.tmp', 'w') as f: # written last, so the playlist only exists once every rendition does
+            f.write('#EXTM3U\n#EXT-X-VERSION:3\n')
+            for height, kbps in sorted(ladder, reverse=True):
+                f.write('#EXT-X-STREAM-INF:BANDWIDTH=%d,RESOLUTION=%dx%d\n%s_%dp.m3u8\n'%((kbps*1.1+HLS_AUDIO_KBPS)*1000, width(height), height, name, height))
+        os.replace(playlist+'.tmp', playlist)
+        return playlist
+
+    def hls_args(self, segments):
+        return ['-start_number', '0', '-hls_time', str(HLS_SEGMENT_TIME), '-hls_list_size', '0', '-hls_segment_filename', segments, '-f', 'hls']
+
+    def run(self, cmd):
+        """Run a niced subprocess that is terminated on shutdown and return its output."""
+        p = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, preexec_fn=lambda: os.nice(10))
+        self.processes.add(p)
+        try:
+            out, err = p.communicate()
+        finally:
+            self.processes.discard(p)
+        if p.returncode:
+            raise Exception('%s failed: %s'%(cmd[0], err.decode(errors='replace')[-500:]))
+        return out
+
+recordings = RecordingJobs(RECORDING_STAGE_WORKERS)
+
+def expire_invitations():
+    """Move invitations between pending and expired as their last proposed date passes the `invitations.neededdays` limit."""
+    lim = datetime.datetime.now() + datetime.timedelta(days=conf('invitations.neededdays'))
+    with conn() as c:
+        expired = c.execute("UPDATE invitations SET status='expired' WHERE status='pending' AND (last_date<=? OR last_date IS NULL)", (lim,)).rowcount
+        reopened = c.execute("UPDATE invitations SET status='pending' WHERE status='expired' AND last_date>?", (lim,)).rowcount
+    if expired or reopened:
+        log.debug('%d invitations expired, %d reopened'%(expired, reopened))
+
+# The due functions return when their job next has work, None if it has none. The date windows
+# of the jobs are compared against date('now'), so they open at midnight UTC, which is where
+# these are computed by SQLite as well.
+
+def announcements_due():
+    """When the announcement window of a talk next opens (5 days before it, and again the day before)."""
+    with conn() as c:
+        due, = c.execute("""SELECT MIN(due) FROM (
+                              SELECT datetime(date, '-5 day', 'start of day', 'localtime') AS due FROM events WHERE announced<=0 AND date>date('now','+1 day')
+                              AND NOT EXISTS (SELECT 1 FROM outbox WHERE announce_date=events.date AND announce_warmup=events.warmup AND announce_level>=1)
+                              UNION ALL
+                              SELECT datetime(date, '-1 day', 'start of day', 'localtime') FROM events WHERE announced<=1 AND date>date('now','+1 day')
+                              AND NOT EXISTS (SELECT 1 FROM outbox WHERE announce_date=events.date AND announce_warmup=events.warmup AND announce_level>=2))""").fetchone()
+    return dateutil.parser.isoparse(due) if due else None
+
+def recordings_due():
+    """When the recording of a talk with consent is next expected to be available (the second day after it)."""
+    with conn() as c:
+        due, = c.execute("""SELECT datetime(date, '+2 day', 'start of day', 'localtime') FROM events WHERE recording_processed=0 AND recording_consent=1
+                            AND NOT EXISTS (SELECT 1 FROM recording_jobs WHERE recording_jobs.date=events.date AND recording_jobs.warmup=events.warmup)
+                            ORDER BY date ASC LIMIT 1""").fetchone() or (None,)
+    return dateutil.parser.isoparse(due) if due else None
+
+def invitations_due():
+    """When the next pending invitation expires, or now if some invitation has to change its status."""
+    needed = datetime.timedelta(days=conf('invitations.neededdays'))
+    now = datetime.datetime.now()
+    with conn() as c:
+        if c.execute("""SELECT 1 FROM invitations WHERE status='pending' AND last_date IS NULL
+                        UNION ALL SELECT 1 FROM invitations WHERE status='expired' AND last_date>? LIMIT 1""", (now+needed,)).fetchone():
+            return now
+        last = c.execute("SELECT last_date FROM invitations WHERE status='pending' ORDER BY last_date ASC LIMIT 1").fetchone()
+    return last[0]-needed if last else None
+
+SCHEDULER_MAX_SLEEP = 3600 # seconds, due times are recomputed at least this often, for writes made by other processes
+SCHEDULER_MIN_INTERVAL = 60 # seconds between two runs of a job, in case a run leaves its due work undone
+SCHEDULER_RETRY = 600 # seconds before running a failed job again
+
+class Scheduler:
+    """Runs every job when its due function says it has work, instead of polling on a fixed period.
+
+    The thread sleeps until the earliest due time and recomputes them after
+    every run, after every committed write to `events` and at least every
+    `SCHEDULER_MAX_SLEEP`. The last and next run of each job are kept in the
+    `scheduled_jobs` table, and jobs can be run right away from the admin panel."""
+    def __init__(self, jobs):
+        self.jobs = collections.OrderedDict((name, (f, due)) for name, f, due in jobs)
+        self.wakeup = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.requested = [] # names of the jobs to run right away
+
+    def start(self):
+        with conn() as c:
+            c.executemany('INSERT OR IGNORE INTO scheduled_jobs (name) VALUES (?)', [(name,) for name in self.jobs])
+        self.running = True
+        self.thread = threading.Thread(target=self.work, name='scheduler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        with self.wakeup:
+            self.wakeup.notify_all()
+        if self.thread:
+            self.thread.join()
+
+    def notify(self):
+        """Recompute the due times, e.g. after a talk was added or moved."""
+        with self.wakeup:
+            self.wakeup.notify()
+
+    def run_now(self, name):
+        if name not in self.jobs:
+            raise KeyError(name)
+        with self.wakeup:
+            if name not in self.requested:
+                self.requested.append(name)
+            self.wakeup.notify()
+
+    def next_runs(self, now):
+        """The next run of every job, no sooner than `SCHEDULER_MIN_INTERVAL` (or `SCHEDULER_RETRY` after a failure) after its last run."""
+        with conn() as c:
+            last = {name: (last_run, last_error) for name, last_run, last_error in c.execute('SELECT name, last_run, last_error FROM scheduled_jobs')}
+        runs = {}
+        for name, (f, due) in self.jobs.items():
+            last_run, last_error = last.get(name, (None, None))
+            try:
+                next_run = due()
+            except Exception as e:
+                log.error('Failure in computing when the scheduled job %s is due due to %s'%(name, e))
+                next_run, last_error = now, str(e)
+            if next_run is not None and last_run is not None:
+                next_run = max(next_run, last_run + datetime.timedelta(seconds=SCHEDULER_RETRY if last_error else SCHEDULER_MIN_INTERVAL))
+            runs[name] = next_run
+        with conn() as c:
+            c.executemany('UPDATE scheduled_jobs SET next_run=? WHERE name=?', [(t, name) for name, t in runs.items()])
+        return runs
+
+    def run(self, name):
+        f, due = self.jobs[name]
+        start, t, error = datetime.datetime.now(), time.monotonic(), None
+        try:
+            with tracer.trace(f.__name__):
+                f()
+        except Exception as e:
+            log.error('Failure in the scheduled job %s due to %s'%(name, e))
+            error = str(e)
+        with conn() as c:
+            c.execute('UPDATE scheduled_jobs SET last_run=?, last_duration=?, last_error=?, runs=runs+1 WHERE name=?',
+                      (start, time.monotonic()-t, error, name))
 
-scheduled_events = [
-    (check_upcoming_talks_and_email, 3600*2),
-    (check_recordings_and_download, 3600*2),
-        ]
+    def work(self):
+        while self.running:
+            now = datetime.datetime.now()
+            try:
+                runs = self.next_runs(now)
+            except Exception as e:
+                log.error('Failure in computing when the scheduled jobs are due due to %s'%e)
+                runs = {}
+            with self.wakeup:
+                requested, self.requested = self.requested, []
+            due = requested + [name for name, t in runs.items() if t is not None and t<=now and name not in requested]
+            for name in due:
+                self.run(name)
+            if due:
+                continue
+            sleep = min([(t-now).total_seconds() for t in runs.values() if t is not None]+[SCHEDULER_MAX_SLEEP])
+            with self.wakeup:
+                if self.running and not self.requested:
+                    self.wakeup.wait(max(0, sleep))
+
+scheduler = Scheduler([
+    ('announcements', check_upcoming_talks_and_email, announcements_due),
+    ('recordings', check_recordings_and_download, recordings_due),
+    ('invitations', expire_invitations, invitations_due),
+    ])
 
 # CherryPy server
 
 class Root:
     @cherrypy.expose
+    @conditional(window=upcoming_window)
+    @cached_page
     def index(self):
-        with conn() as c:
-            all_talks = list(c.execute('SELECT date, speaker, affiliation, title, abstract, bio, conf_link, location FROM events WHERE warmup=0 ORDER BY date ASC'))
         now = datetime.datetime.now() - datetime.timedelta(days=2)
-        records = [t for t in all_talks if t[0]>now]
+        with conn() as c:
+            records = list(c.execute('SELECT date, speaker, affiliation, title, abstract, bio, conf_link, location FROM events WHERE warmup=0 AND date>? ORDER BY date ASC', (now,)))
         return templates.get_template('__index.html').render(records=records, customfooter=conf('frontpage.footer'))
 
     @cherrypy.expose
+    @conditional(window=upcoming_window)
+    @cached_page
     def iframeupcoming(self):
-        with conn() as c:
-            all_talks = list(c.execute('SELECT date, speaker, affiliation, title, abstract, bio, conf_link, location FROM events WHERE warmup=0 ORDER BY date ASC'))
         now = datetime.datetime.now() - datetime.timedelta(days=2)
-        records = [t for t in all_talks if t[0]>now]
+        with conn() as c:
+            records = list(c.execute('SELECT date, speaker, affiliation, title, abstract, bio, conf_link, location FROM events WHERE warmup=0 AND date>? ORDER BY date ASC', (now,)))
         return templates.get_template('__iframeupcoming.html').render(records=records)
 
     @cherrypy.expose
+    @cached_page
     def about(self):
         return templates.get_template('__about.html').render(seminar=conf('event.name'),description=conf('event.description'),longdescription=conf('event.longdescription'),aboutnonlocally='')
 
 
+PAST_PAGE_SIZE = 20
+SEARCH_PAGE_SIZE = 20
+SEARCH_WEIGHTS = (8.0, 3.0, 10.0, 1.0, 1.0) # bm25 weights of speaker, affiliation, title, abstract, bio
+SEARCH_RANK_LIMIT = 500 # only the most recent matches are ranked, which bounds the cost of very common words
+SEARCH_MARKS = ('\x02', '\x03') # around the matches, replaced by <mark> after escaping the text
+
+def search_query(q):
+    """FTS5 query matching talks that contain every word of `q` (after stemming)."""
+    return ' '.join('"%s"'%w for w in re.findall(r'\w+', q))
+
+def highlighted(text):
+    return html.escape(text or '').replace(SEARCH_MARKS[0], '<mark>').replace(SEARCH_MARKS[1], '</mark>')
+
 class Past:
     @cherrypy.expose
-    def index(self):
-        with conn() as c:
-            all_talks = list(c.execute('SELECT date, speaker, affiliation, title, abstract, bio, recording_consent, recording_link, location, recording_processed FROM events WHERE warmup=0 ORDER BY date DESC'))
+    @conditional(window=past_window)
+    @cached_page
+    def index(self, before=None):
+        records, next = self.page(before)
+        return templates.get_template('__past.html').render(records=records, next=next)
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out()
+    @conditional(window=past_window)
+    @cached_json
+    def fragment(self, before=None):
+        records, next = self.page(before)
+        return {'html': templates.get_template('__past_records.html').render(records=records),
+                'next': str(next) if next else None}
+
+    @staticmethod
+    def page(before):
+        """Keyset pagination over (date): the talks before `before` and the cursor for the next page."""
         now = datetime.datetime.now()
-        records = [t for t in all_talks if t[0]<now]
-        return templates.get_template('__past.html').render(records=records)
+        try:
+            before = dateutil.parser.isoparse(before) if before else now
+        except ValueError:
+            raise cherrypy.HTTPError(400, 'Could not parse the date %s'%before)
+        if before.tzinfo: # the talks are stored in server local time
+            before = before.astimezone().replace(tzinfo=None)
+        before = min(before, now)
+        with conn() as c:
+            records = list(c.execute('SELECT date, speaker, affiliation, title, abstract, bio, recording_consent, recording_link, location, recording_processed FROM events WHERE warmup=0 AND date<? ORDER BY date DESC LIMIT ?', (before, PAST_PAGE_SIZE+1)))
+        next = records[PAST_PAGE_SIZE-1][0] if len(records) > PAST_PAGE_SIZE else None
+        return records[:PAST_PAGE_SIZE], next
+
+    @cherrypy.expose
+    @conditional(window=past_window)
+    def search(self, q='', page='0', format='html'):
+        try:
+            page = max(0, int(page))
+        except ValueError:
+            raise cherrypy.HTTPError(400, 'Could not parse the page %s'%page)
+        results, more = self.search_page(q, page)
+        if format == 'json':
+            cherrypy.response.headers['Content-Type'] = 'application/json'
+            return json.dumps({'q': q, 'page': page, 'next': page+1 if more else None,
+                               'results': [dict(r, date=str(r['date'])) for r in results]}).encode()
+        return templates.get_template('__past_search.html').render(q=q, page=page, results=results, more=more)
+
+    @staticmethod
+    def search_page(q, page):
+        """The talks matching `q`, best first, with the matches marked in HTML, and whether there are more."""
+        match = search_query(q)
+        if not match:
+            return [], False
+        # Ordering by `rank` lets FTS5 hand out rows best first, so the join, highlight and
+        # snippet only run for the rows of the page, not for every match.
+        with conn() as c:
+            rows = list(c.execute("""SELECT events.date, highlight(talks_fts, 0, :open, :close), highlight(talks_fts, 1, :open, :close),
+                                            highlight(talks_fts, 2, :open, :close), snippet(talks_fts, 3, :open, :close, '...', 40),
+                                            events.recording_consent AND events.recording_processed
+                                     FROM talks_fts JOIN events ON events.rowid=talks_fts.rowid
+                                     WHERE talks_fts MATCH :match AND rank MATCH :rank
+                                     AND talks_fts.rowid >= coalesce((SELECT rowid FROM talks_fts WHERE talks_fts MATCH :match ORDER BY rowid DESC LIMIT 1 OFFSET :ranked), 0)
+                                     AND events.warmup=0 AND events.date<:now
+                                     ORDER BY rank LIMIT :limit OFFSET :offset""",
+                                  {'open': SEARCH_MARKS[0], 'close': SEARCH_MARKS[1], 'match': match, 'rank': 'bm25(%s)'%', '.join(map(str, SEARCH_WEIGHTS)),
+                                   'ranked': SEARCH_RANK_LIMIT-1, 'now': datetime.datetime.now(), 'limit': SEARCH_PAGE_SIZE+1, 'offset': page*SEARCH_PAGE_SIZE}))
+        results = [{'date': date, 'url': '/event/%s/0'%date, 'speaker': highlighted(speaker), 'affiliation': highlighted(affiliation),
+                    'title': highlighted(title), 'snippet': highlighted(snippet), 'recording': bool(recording)}
+                   for date, speaker, affiliation, title, snippet, recording in rows[:SEARCH_PAGE_SIZE]]
+        return results, len(rows) > SEARCH_PAGE_SIZE
 
 @cherrypy.popargs('date', 'warmup')
 class Event:
     @cherrypy.expose
+    @conditional()
+    @cached_page
     def index(self, date, warmup):
         try:
             with conn() as c:
@@ -348,17 +1634,203 @@ class Event:
                 if not warmup:
                     has_warmup = c.execute('SELECT COUNT(*) FROM events WHERE warmup=? AND date=?', (True, parseddate)).fetchone()[0]
         except:
+            talk = None
+        if talk is None:
             log.error('Attempted opening unknown talk %s %s'%(date, warmup))
             return templates.get_template('__blank.html').render(content='There does not exist a talk given at that time in our database!')
         if not conf('zoom.clientid'): # in case no Zoom is set up at all
-            talk['conf_link'] = None
+            talk = talk[:7]+(None,)+talk[8:] # conf_link
         return templates.get_template('__event.html').render(talk=talk, has_warmup=not warmup and has_warmup)
 
 
+EXPORT_POLL = 60 # seconds between checks for talks written by other processes (e.g. add_old_events.py)
+EXPORT_RETRY = 300 # seconds before retrying a failed export
+
+class StaticExport:
+    """Public pages pre-rendered into `export.dir`, for the reverse proxy to serve without going through CherryPy.
+
+    Everything is exported at start and on config reloads, the pages of the
+    talks written in a transaction (and the listings showing them) after it
+    commits, and the listings when a talk crosses the upcoming/past
+    boundary. Every file is replaced atomically, next to its precompressed
+    .br and .gz versions. Pages that need a password (`server.alluser`) are
+    not exported and removed if they were, as is everything in a previous
+    `export.dir`. Disabled while `export.dir` is empty."""
+    def __init__(self):
+        self.wakeup = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.everything = True
+        self.dates = set() # of the talks changed since the last export
+        self.version = None # of the events table when it was last exported
+        self.directory = None # `export.dir` of the last export
+        self.boundary = None # time at which a talk next moves between upcoming and past
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.work, name='export', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        with self.wakeup:
+            self.wakeup.notify_all()
+        if self.thread:
+            self.thread.join()
+
+    def changed(self, dates=None):
+        """Queue the pages of the talks on `dates` for export, or every page if None."""
+        with self.wakeup:
+            if dates is None:
+                self.everything = True
+            else:
+                self.dates.update(dates)
+            self.wakeup.notify()
+
+    def work(self):
+        while self.running:
+            with self.wakeup:
+                if not self.everything and not self.dates:
+                    self.wakeup.wait(max(0, min(EXPORT_POLL, (self.boundary or float('inf'))-time.time())))
+                everything, dates = self.everything, self.dates
+                self.everything, self.dates = False, set()
+            if not self.running:
+                break
+            try:
+                with tracer.trace('export'):
+                    self.export(everything, dates)
+            except Exception as e:
+                log.error('failed to export the public pages due to %s'%e)
+                with self.wakeup:
+                    self.everything = True
+                    self.wakeup.wait(EXPORT_RETRY)
+
+    def export(self, everything, dates):
+        directory = conf('export.dir', '')
+        if directory != self.directory: # the old one is still served by the reverse proxy until it is emptied
+            if self.directory:
+                self.remove(self.directory, ['/', '/iframeupcoming', '/about', '/past/'], events=True)
+            self.directory, everything = directory, True
+        if not directory:
+            return
+        private = []
+        if conf('server.alluser'): # only the pages without a password can be exported
+            private = ['/past/'] if conf('server.publicfrontpageoverride') else ['/', '/iframeupcoming', '/about', '/past/']
+            self.remove(directory, private, events=True)
+            if len(private) == 4:
+                return
+        with conn() as c:
+            version, = c.execute("SELECT version FROM data_versions WHERE name='events'").fetchone()
+        if version != self.version and not dates: # written by another process, which does not say which talks
+            if self.version is not None:
+                page_cache.invalidate()
+            everything = True
+        self.version = version
+        now = datetime.datetime.now()
+        pages = set()
+        if self.boundary is not None and time.time() >= self.boundary: # the cached listings still show the talk on the wrong side
+            page_cache.invalidate()
+            pages.update(['/', '/iframeupcoming', '/past/'])
+        if everything:
+            pages.update(['/', '/iframeupcoming', '/past/'])
+        for date in dates:
+            date = dateutil.parser.isoparse(date)
+            if date > now-datetime.timedelta(days=2):
+                pages.update(['/', '/iframeupcoming'])
+            if date < now:
+                pages.add('/past/')
+        if everything:
+            pages.add('/about')
+        with conn() as c:
+            if everything:
+                talks = set(c.execute('SELECT date, warmup FROM events'))
+            else:
+                talks = set(c.execute('SELECT date, warmup FROM events WHERE date IN (%s)'%','.join('?'*len(dates)), list(dates)))
+            self.boundary = min([time.mktime(d.timetuple()) for d, in
+                                 c.execute('SELECT date FROM events WHERE warmup=0 AND date>? ORDER BY date ASC LIMIT 1', (now,))]
+                               +[time.mktime((d+datetime.timedelta(days=2)).timetuple()) for d, in
+                                 c.execute('SELECT date FROM events WHERE warmup=0 AND date>? ORDER BY date ASC LIMIT 1', (now-datetime.timedelta(days=2),))]
+                               or [None])
+        if private:
+            pages -= set(private)
+        else:
+            for date, warmup in talks:
+                pages.add('/event/%s/%d/'%(date, warmup))
+        root, past, event = Root(), Past(), Event()
+        handlers = {'/': (root, Root.index, {}), '/iframeupcoming': (root, Root.iframeupcoming, {}),
+                    '/about': (root, Root.about, {}), '/past/': (past, Past.index, {})}
+        for path in pages:
+            obj, f, kwargs = handlers.get(path) or (event, Event.index, dict(zip(('date', 'warmup'), path.split('/')[2:4])))
+            try: # one broken page should not keep the others stale
+                self.write(directory, path, render_cached(obj, inspect.unwrap(f), kwargs=kwargs))
+            except Exception as e:
+                log.error('failed to export %s due to %s'%(path, e))
+        if not private:
+            self.prune(directory, {'/event/%s/%d/'%t for t in talks}, everything, dates)
+        if everything:
+            self.copy_assets(directory)
+        log.debug('exported %d pages to %s'%(len(pages), directory))
+
+    @staticmethod
+    def filename(directory, path):
+        parts = path.strip('/').split('/')
+        return os.path.join(directory, *parts, 'index.html') if path.endswith('/') else os.path.join(directory, *parts[:-1], parts[-1]+'.html')
+
+    def write(self, directory, path, page):
+        filename = self.filename(directory, path)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        suffixes = dict(STATIC_ENCODINGS)
+        for encoding in PAGE_ENCODINGS+[None]: # the page itself last, so it never exists without its compressed versions
+            target = filename+suffixes.get(encoding, '')
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(filename), prefix='.export-', delete=False) as f:
+                f.write(page.encoded(encoding))
+            os.chmod(f.name, 0o644) # readable by the reverse proxy
+            os.replace(f.name, target)
+
+    def prune(self, directory, kept, everything, dates):
+        """Remove the exported pages of deleted talks."""
+        for filename in glob.glob(os.path.join(glob.escape(directory), 'event', '*', '*', 'index.html')):
+            date, warmup = filename.split(os.sep)[-3:-1]
+            if '/event/%s/%s/'%(date, warmup) in kept or not (everything or date in dates):
+                continue
+            self.remove_file(filename)
+            with contextlib.suppress(OSError): # not empty, e.g. the other talk of that date is still there
+                os.rmdir(os.path.dirname(filename))
+                os.rmdir(os.path.dirname(os.path.dirname(filename)))
+
+    def remove(self, directory, paths, events=False):
+        """Remove the exported `paths` and, with `events`, every event page, e.g. once they need a password."""
+        for path in paths:
+            self.remove_file(self.filename(directory, path))
+        if events:
+            shutil.rmtree(os.path.join(directory, 'event'), ignore_errors=True)
+
+    @staticmethod
+    def remove_file(filename):
+        """Remove an exported page and its compressed versions."""
+        for suffix in ['']+[s for e, s in STATIC_ENCODINGS]: # the page first, the reverse proxy only looks for the others next to it
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(filename+suffix)
+
+    def copy_assets(self, directory):
+        """Copy the fingerprinted static files, they never change so existing ones are kept."""
+        for name, encodings in static_assets.items():
+            for suffix in ['']+[s for e, s in encodings]:
+                target = os.path.join(directory, 'static', name+suffix)
+                if not os.path.exists(target):
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    shutil.copyfile(os.path.join(STATIC_BUILD, name+suffix), target+'.tmp')
+                    os.chmod(target+'.tmp', 0o644)
+                    os.replace(target+'.tmp', target)
+
+exporter = StaticExport()
+config.listeners.append(exporter.changed)
+
+
 class Apply:
     @cherrypy.expose
     def index(self):
-        slots = []#self.available_talks()
+        slots = self.available_talks()
         if slots:
             return templates.get_template('apply_index.html').render(slots=slots)
         else:
@@ -367,13 +1839,14 @@ class Apply:
     @staticmethod
     def available_talks():
         with conn() as c:
-            c = c.cursor()
-            maintalks = list(c.execute('SELECT date, speaker, title FROM events WHERE warmup=0'))
-            warmuptalks = set(d[0] for d in c.execute('SELECT date FROM events WHERE warmup!=0'))
-        main_talks_dict = {d: (s,t) for d,s,t in maintalks}
-        good_dates = set(main_talks_dict.keys()) - warmuptalks
-        good_talks = [(d,*main_talks_dict[d]) for d in good_dates if d>datetime.datetime.now()]
-        return good_talks
+            return list(c.execute('SELECT date, speaker, title FROM open_slots WHERE date>? ORDER BY date', (datetime.datetime.now(),)))
+
+    @staticmethod
+    def open_slots(dates):
+        """The subset of `dates` that are still open for a warmup talk."""
+        with conn() as c:
+            return set(d for (d,) in c.execute('SELECT date FROM open_slots WHERE date>? AND date IN (%s)'%','.join('?'*len(dates)),
+                                               [datetime.datetime.now()]+list(dates)))
 
     @cherrypy.expose
     def do(self, **kwargs):
@@ -386,39 +1859,42 @@ class Apply:
             data.append(v)
         dates = [dateutil.parser.isoparse(v) for k,v in kwargs.items()
                  if k.startswith('date')]
-        dates = '|'.join(repr(d) for d in dates) # TODO register a converter
-        args = args + ', warmup, uuid, dates'
-        args_s.extend(['warmup', 'uuid', 'dates'])
-        data.extend([True, uid, dates])
+        args = args + ', warmup, uuid'
+        args_s.extend(['warmup', 'uuid'])
+        data.extend([True, uid])
         data_dict = dict(zip(args_s, data))
         placeholders = ("?,"*len(args_s))[:-1]
-        good_talks = self.available_talks()
-        if set(dates) > set([g for g,s,t in good_talks]):
+        if set(dates) - self.open_slots(dates):
             return templates.get_template('apply_blank.html').render(content='There was a problem with parsing the dates! Contact the administrator if the problem persists!')
         with conn() as c:
             c = c.cursor()
             c.execute('INSERT INTO applications (%s) VALUES (%s)'%(args, placeholders),
                       data)
+            c.executemany('INSERT OR IGNORE INTO application_dates (uuid, date) VALUES (?, ?)', [(uid, d) for d in dates])
         text_content = html_content = 'You or someone on your behalf applied to give a warmup talk for our seminar series. The submission was successful. You will receive an email with a decision, depending on availability, before the talk.'
         subject = 'Speaker application: %s'%data_dict['title']
         send_email(text_content, html_content, data_dict['email'], subject)
         return templates.get_template('apply_blank.html').render(content=text_content)
 
 
+INVITATION_STATUSES = ['pending', 'accepted', 'expired']
+INVITES_PAGE_SIZE = 50
+
+DATES_TABLES = {'invitations': 'invitation_dates', 'applications': 'application_dates'}
+
 def available_dates(uuid, table='invitations', daysoffset=0):
+    today = datetime.datetime.now() + datetime.timedelta(days=daysoffset)
     with conn() as c:
         c = c.cursor()
-        c.execute('SELECT dates, warmup, confirmed_date FROM %s WHERE uuid=?'%table, (uuid,))
-        dates, warmup, confirmed_date  = c.fetchone()
-    suggested_dates = parsedates(dates) # TODO register a converter
-    with conn() as c:
-        c = c.cursor()
-        c.execute('SELECT date FROM events WHERE warmup=?', (warmup,))
-        occupied_dates = [d[0] for d in c.fetchall()]
-    good_dates = set(suggested_dates) - set(occupied_dates)
+        c.execute('SELECT confirmed_date FROM %s WHERE uuid=?'%table, (uuid,))
+        confirmed_date, = c.fetchone()
+        c.execute("""SELECT proposed.date FROM {dates} AS proposed JOIN {table} ON {table}.uuid=proposed.uuid
+                     WHERE proposed.uuid=? AND proposed.date>?
+                     AND NOT EXISTS (SELECT 1 FROM events WHERE events.date=proposed.date AND events.warmup={table}.warmup)""".format(dates=DATES_TABLES[table], table=table),
+                  (uuid, today))
+        good_dates = set(d for (d,) in c.fetchall())
     if confirmed_date:
         good_dates = good_dates.union(set([confirmed_date]))
-    today = datetime.datetime.now() + datetime.timedelta(days=daysoffset)
     good_dates = sorted([d for d in good_dates if d>today])
     return good_dates, confirmed_date
 
@@ -508,23 +1984,26 @@ class Invite:
                              ', '.join('%s=excluded.%s'%(a,a) for a in args_s)
                          ),
                       data)
-            c.execute('UPDATE invitations SET confirmed_date=? WHERE uuid=?',
+            c.execute("UPDATE invitations SET confirmed_date=?, status='accepted' WHERE uuid=?",
                       (data[0],euuid))
 
         # Zoom and Calendar and Schedule
         if not confirmed_date:
             # Zoom
-            Invite.makezoom(data_dict)
+            with span('invite', 'makezoom'):
+                Invite.makezoom(data_dict)
             # Calendar
             Invite.makecalevent(data_dict)
             # Sched
-            Invite.makesched(data_dict)
+            with span('invite', 'makesched'):
+                Invite.makesched(data_dict)
         # Email
         text_content = subject = '%s, schedule and updates for your talk on %s!'%(data_dict['speaker'], data_dict['date'])
         url = 'https://'+conf('server.url')+'/invite/'+euuid
         public_url = 'https://'+conf('server.url')+'/event/'+str(data_dict['date'])+'/'+str(data_dict['warmup'])
         html_content = '<p>Your schedule and a videoconf link are now available at <a href="%s">%s</a>. <strong>Keep this link private</strong>.<br>For the public announcement see <a href="%s">%s</a></p>'%(url, url, public_url, public_url) 
-        send_email(text_content, html_content, data_dict['email'], subject, cc=[host_email] if host_email else [])
+        with span('invite', 'send_email'):
+            send_email(text_content, html_content, data_dict['email'], subject, cc=[host_email] if host_email else [])
         return templates.get_template('invite_blank.html').render(content='Submission successful! '+html_content)
 
     @staticmethod
@@ -554,6 +2033,7 @@ class Invite:
         try:
             prefix = data_dict['date'].strftime('%Y%m%d')
             padid = prefix+str(uuid.uuid4()).replace('-','')
+            etherpad = etherpad_client()
             #etherpad.copyPad(conf('etherpad.scheduletemplate'), padid)
             etherpad.createPad(padid)
             templatehtml = etherpad.getHtml(conf('etherpad.scheduletemplate'))['html']
@@ -612,6 +2092,7 @@ class Admin:
             with sqlite3.connect(os.path.join(file_dir,CONF_FILENAME)) as conn:
                 conn.cursor().execute('UPDATE config SET value=? WHERE key=?', (value,key))
                 conn.commit()
+            config.reload()
             raise cherrypy.HTTPRedirect("../config#panel-%s"%key)
         raise cherrypy.HTTPError(403)
 
@@ -619,7 +2100,7 @@ class Admin:
     def invite(self):
         today = datetime.datetime.now()
         with conn() as c:
-            takendates = [d for (d,) in c.execute('SELECT date FROM events WHERE warmup=0 ORDER BY date ASC') if d>today]
+            takendates = [d for (d,) in c.execute('SELECT date FROM events WHERE warmup=0 AND date>? ORDER BY date ASC', (today,))]
         start_of_month = datetime.datetime(today.year, today.month, 1)
         removedates = [start_of_month]
         day = datetime.timedelta(days=1)
@@ -647,10 +2128,12 @@ class Admin:
         uid = str(uuid.uuid4())
         try:
             with conn() as c:
-                c.execute('INSERT INTO invitations (uuid, email, dates, warmup, host, host_email, confirmed_date, location) VALUES (?, ?, ?, ?, ?, ?, NULL, ?)',
-                          (uid, email, '|'.join(repr(d) for d in dates), warmup, host, host_email, location))
+                lim = datetime.datetime.now() + datetime.timedelta(days=conf('invitations.neededdays'))
+                c.execute('INSERT INTO invitations (uuid, email, warmup, host, host_email, confirmed_date, location, status, last_date) VALUES (?, ?, ?, ?, ?, NULL, ?, ?, ?)',
+                          (uid, email, warmup, host, host_email, location, 'pending' if max(dates)>lim else 'expired', max(dates)))
+                c.executemany('INSERT OR IGNORE INTO invitation_dates (uuid, date) VALUES (?, ?)', [(uid, d) for d in dates])
         except Exception as e:
-            log.error('Could not insert %s due to %s'%((uid, email, '|'.join(repr(d) for d in dates), warmup, host, host_email),e))
+            log.error('Could not insert %s due to %s'%((uid, email, dates, warmup, host, host_email),e))
             return templates.get_template('admin_blank.html').render(content='There was a problem with the database! Try again!')
         # Email
         text_content = subject = conf('invitations.email_subject_line')
@@ -672,15 +2155,27 @@ class Admin:
             return templates.get_template('admin_blank.html').render(content='The invite is available at <a href="/invite/%s">/invite/%s</a>. No emails were send, but here is a draft you can use yourself when mailing %s: <div>%s</div>'%(uid,uid, email_link, html_panel))
 
     @cherrypy.expose
-    def invitestatus(self):
+    def invitestatus(self, status=None, page='0'):
+        try:
+            page = max(0, int(page))
+        except ValueError:
+            raise cherrypy.HTTPError(400)
+        if status not in INVITATION_STATUSES:
+            status = None
         with conn() as c:
-            all_invites = list(c.execute('SELECT uuid, email, confirmed_date, dates FROM invitations'))[::-1]
-        lim = datetime.datetime.now() + datetime.timedelta(days=conf('invitations.neededdays'))
-        all_invites = [(uuid, email, confirmed_date, dates, 
-                              'accepted for %s'%confirmed_date if confirmed_date
-                              else 'not accepted yet' if any(d>lim for d in parsedates(dates)) else 'expired')
-                for (uuid, email, confirmed_date, dates) in all_invites]
-        return templates.get_template('admin_invitestatus.html').render(all_invites=all_invites)
+            if status:
+                invites = list(c.execute('SELECT uuid, email, confirmed_date, status FROM invitations WHERE status=? ORDER BY last_date DESC LIMIT ? OFFSET ?',
+                                         (status, INVITES_PAGE_SIZE+1, page*INVITES_PAGE_SIZE)))
+            else:
+                invites = list(c.execute('SELECT uuid, email, confirmed_date, status FROM invitations ORDER BY rowid DESC LIMIT ? OFFSET ?',
+                                         (INVITES_PAGE_SIZE+1, page*INVITES_PAGE_SIZE)))
+        more = len(invites) > INVITES_PAGE_SIZE
+        all_invites = [(uuid, email, confirmed_date,
+                              'accepted for %s'%confirmed_date if s=='accepted'
+                              else 'not accepted yet' if s=='pending' else 'expired')
+                for (uuid, email, confirmed_date, s) in invites[:INVITES_PAGE_SIZE]]
+        return templates.get_template('admin_invitestatus.html').render(all_invites=all_invites, status=status,
+                                                                        page=page, more=more, statuses=INVITATION_STATUSES)
 
     @cherrypy.expose
     def eventstatus(self):
@@ -713,7 +2208,7 @@ class Admin:
 
     @cherrypy.expose
     def judge(self, uuid):
-        args = 'speaker,affiliation,bio,title,abstract,warmup,email,dates,previous_records,confirmed_date,declined'
+        args = 'speaker,affiliation,bio,title,abstract,warmup,email,previous_records,confirmed_date,declined'
         try:
             with conn() as c:
                 c = c.cursor()
@@ -733,7 +2228,7 @@ class Admin:
         good_dates, confirmed_date = available_dates(uuid, table='applications')
         if confirmed_date:
             return templates.get_template('invite_blank.html').render(content='This app has already been accepted!')
-        args = 'speaker,affiliation,bio,title,abstract,warmup,email,dates,previous_records,confirmed_date,declined'
+        args = 'speaker,affiliation,bio,title,abstract,warmup,email,previous_records,confirmed_date,declined'
         try:
             with conn() as c:
                 c = c.cursor()
@@ -767,6 +2262,42 @@ class Admin:
                       (confirmed_date,uuid))
         return templates.get_template('admin_blank.html').render(content='Application accepted!')
 
+    @cherrypy.expose
+    def outbox(self):
+        with conn() as c:
+            messages = list(c.execute("SELECT id, created, subject, recipient, status, attempts, next_attempt, last_error FROM outbox WHERE status!='sent' ORDER BY id DESC"))
+        return templates.get_template('admin_outbox.html').render(messages=messages)
+
+    @cherrypy.expose
+    def outboxretry(self, id):
+        outbox.requeue(int(id))
+        raise cherrypy.HTTPRedirect('/admin/outbox')
+
+    @cherrypy.expose
+    def recordings(self):
+        with conn() as c:
+            jobs = list(c.execute('SELECT date, warmup, stage, status, file_size, bytes_done, attempts, next_attempt, last_error, updated FROM recording_jobs ORDER BY date DESC'))
+        return templates.get_template('admin_recordings.html').render(jobs=jobs)
+
+    @cherrypy.expose
+    def recordingretry(self, date, warmup):
+        recordings.retry(dateutil.parser.isoparse(date), warmup not in ('False', '0'))
+        raise cherrypy.HTTPRedirect('/admin/recordings')
+
+    @cherrypy.expose
+    def jobs(self):
+        with conn() as c:
+            jobs = list(c.execute('SELECT name, last_run, last_duration, last_error, next_run, runs FROM scheduled_jobs ORDER BY name'))
+        return templates.get_template('admin_jobs.html').render(jobs=jobs)
+
+    @cherrypy.expose
+    def jobrun(self, name):
+        try:
+            scheduler.run_now(name)
+        except KeyError:
+            raise cherrypy.HTTPError(404, 'There is no scheduled job %s'%name)
+        raise cherrypy.HTTPRedirect('/admin/jobs')
+
     @cherrypy.expose
     def modevent(self, date, warmup, action):
         try:
@@ -815,6 +2346,7 @@ class Admin:
                 errorstring = 'Invalid input.  <a href="/admin/authtwitter">Click here to try again.</a>'
                 return templates.get_template('admin_blank.html').render(content=errorstring)
 
+        from twitter import Twitter
         for key in Twitter.keytypes:
             if key in formdata:
                 # first step is to try to use updateconf
@@ -846,7 +2378,7 @@ class Admin:
             except:
                 pass
 
-        twitter = Twitter(twitterkeys)
+        twitter = twitter_client(twitterkeys)
         try:
             queries = twitter.login(extradata=formdata)
             disp_queries = []
@@ -914,25 +2446,256 @@ class SysAdmin(Admin):
     access_levels = ['sysadmin']
 
 
+LOG_TAIL_BLOCK = 64*1024 # bytes read at a time from the end of the log
+LOG_TAIL_MAX_BYTES = 16*1024*1024 # how far back /dev/log searches for matching records
+LOG_RECORD_START = re.compile(r'^\d{4}-\d\d-\d\d [\d:,]+:[^:]*:([A-Z]+):')
+
+def tail_log(filename, n, minlevel=logging.NOTSET, q=''):
+    """The last `n` records of the log at or above `minlevel` and containing `q`, oldest first.
+
+    Blocks are read from the end of the file, so only the tail that is
+    needed is read. Lines not starting with a timestamp (e.g. tracebacks)
+    belong to the record before them."""
+    records = []
+    continuation = [] # lines after the header of the record being assembled, newest first
+    with open(filename, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        pos, rest = end, b''
+        while pos > 0 and end-pos < LOG_TAIL_MAX_BYTES and len(records) < n:
+            size = min(LOG_TAIL_BLOCK, pos)
+            pos -= size
+            f.seek(pos)
+            block = f.read(size)+rest
+            chunks = block.split(b'\n')
+            rest = chunks[0] if pos > 0 else b'' # possibly a partial line, finished by the next block
+            lines = chunks[1:] if pos > 0 else chunks
+            for line in reversed(lines):
+                line = line.decode('utf-8', 'replace')
+                m = LOG_RECORD_START.match(line)
+                if m is None:
+                    if line:
+                        continuation.append(line)
+                    continue
+                record = '\n'.join([line]+continuation[::-1])
+                continuation = []
+                if logging.getLevelName(m.group(1)) >= minlevel and q in record:
+                    records.append(record)
+                    if len(records) >= n:
+                        break
+    return records[::-1]
+
+PROFILE_MAX_SECONDS = 120 # longest window accepted by /dev/profile
+PROFILE_SAMPLE_INTERVAL = 0.005 # seconds between stack samples for the collapsed output
+MEMORY_TRACE_FRAMES = 10 # frames kept by tracemalloc for each allocation
+
+class Profiler(cherrypy.Tool):
+    """Profile the requests handled by all worker threads during a time window, on with `tools.profiler.on`.
+
+    cProfile only sees the thread it is enabled in, so while a capture is
+    running every request enables its own profiler and the results are
+    merged at the end. The collapsed-stack output instead samples the
+    stacks of the threads that are in the middle of a request."""
+    def __init__(self):
+        super().__init__('on_start_resource', self.start)
+        self.lock = threading.Lock()
+        self.capturing = None # 'stats' or 'collapsed' while a capture is running
+        self.profiles = []
+        self.active = set() # idents of the threads handling a request
+
+    def _setup(self):
+        super()._setup()
+        cherrypy.request.hooks.attach('on_end_request', self.end)
+
+    def start(self):
+        if self.capturing is None:
+            return
+        request = cherrypy.request
+        ident = threading.get_ident()
+        if self.capturing == 'stats':
+            import cProfile
+            request.profile = cProfile.Profile()
+            request.profile.enable()
+        with self.lock:
+            self.active.add(ident)
+
+    def end(self):
+        request = cherrypy.request
+        profile = getattr(request, 'profile', None)
+        with self.lock:
+            self.active.discard(threading.get_ident())
+            if profile is not None:
+                profile.disable()
+                self.profiles.append(profile)
+                request.profile = None
+
+    def capture(self, seconds, mode):
+        """Profile for `seconds` and return the merged `pstats.Stats` (None without requests) or a {stack: samples} dict."""
+        with self.lock:
+            if self.capturing is not None:
+                return None
+            self.capturing, self.profiles = mode, []
+        me = threading.get_ident()
+        try:
+            if mode == 'collapsed':
+                stacks = collections.Counter()
+                deadline = time.monotonic()+seconds
+                while time.monotonic() < deadline:
+                    with self.lock:
+                        active = self.active - {me}
+                    samples = []
+                    for i, f in sys._current_frames().items(): # walk the stacks right away, the threads keep running
+                        if i in active:
+                            codes = []
+                            while f is not None:
+                                codes.append(f.f_code)
+                                f = f.f_back
+                            samples.append(codes)
+                    f = None
+                    for codes in samples:
+                        stacks[';'.join('%s:%s:%d'%(os.path.basename(c.co_filename), c.co_name, c.co_firstlineno) for c in reversed(codes))] += 1
+                    time.sleep(PROFILE_SAMPLE_INTERVAL)
+                return stacks
+            time.sleep(seconds)
+        finally:
+            with self.lock:
+                self.capturing = None
+                profiles, self.profiles = self.profiles, []
+        import pstats
+        return pstats.Stats(*profiles) if profiles else pstats.Stats()
+
+cherrypy.tools.profiler = Profiler()
+
 class Dev:
+    memory_baseline = None
+
     @cherrypy.expose
-    def objgraph(self):
-        import objgraph
-        return '<br>'.join(map(str,objgraph.most_common_types(limit=300)))
+    def metrics(self):
+        cherrypy.response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+        return metrics.render(extra=[(('briefings_page_cache_total', (('result', 'hit'),)), page_cache.hits),
+                                     (('briefings_page_cache_total', (('result', 'miss'),)), page_cache.misses)])
+
     @cherrypy.expose
-    def log(self):
-        import subprocess
-        lines = subprocess.Popen(['tail','-n',1000,logfile], stdout=subprocess.PIPE).stdout.readlines()
-        return '<pre>%s</pre>'%'\n'.join(lines)
+    def traces(self, id=None, format='html'):
+        if id:
+            trace = tracer.get(id)
+            if trace is None:
+                raise cherrypy.HTTPError(404, 'The trace %s is not kept anymore'%id)
+            if format == 'json':
+                cherrypy.response.headers['Content-Type'] = 'application/json'
+                return json.dumps(trace.json()).encode()
+            return templates.get_template('dev_traces.html').render(trace=trace)
+        recent, slowest = tracer.snapshot()
+        if format == 'json':
+            cherrypy.response.headers['Content-Type'] = 'application/json'
+            return json.dumps({'recent': [t.json() for t in recent], 'slowest': [t.json() for t in slowest]}).encode()
+        return templates.get_template('dev_traces.html').render(recent=recent, slowest=slowest)
 
+    @cherrypy.expose
+    def profile(self, seconds='10', format='stats', sort='cumulative', limit='100'):
+        """Profile all worker threads for `seconds`, format=collapsed gives stacks for flamegraph.pl or speedscope."""
+        try:
+            seconds, limit = float(seconds), int(limit)
+        except ValueError:
+            raise cherrypy.HTTPError(400, 'Could not parse seconds=%s and limit=%s'%(seconds, limit))
+        if not 0 < seconds <= PROFILE_MAX_SECONDS:
+            raise cherrypy.HTTPError(400, 'Profiling is limited to %d seconds'%PROFILE_MAX_SECONDS)
+        if format not in ('stats', 'collapsed'):
+            raise cherrypy.HTTPError(400, 'Unknown format %s'%format)
+        result = cherrypy.tools.profiler.capture(seconds, format)
+        if result is None:
+            raise cherrypy.HTTPError(409, 'Another profile is being captured')
+        cherrypy.response.headers['Content-Type'] = 'text/plain; charset=utf-8'
+        if format == 'collapsed':
+            return ''.join('%s %d\n'%(stack, n) for stack, n in result.most_common())
+        if not result.total_calls:
+            return 'No requests were handled in the last %g seconds.\n'%seconds
+        out = io.StringIO()
+        result.stream = out
+        try:
+            result.sort_stats(sort).print_stats(limit)
+        except KeyError:
+            raise cherrypy.HTTPError(400, 'Unknown sort key %s'%sort)
+        return out.getvalue()
 
-class Zoom:
     @cherrypy.expose
-    def index(self):
-        return "Zoom integration is controlled from the admin panel."
+    def memory(self, baseline=None, stop=None, group='lineno', limit='50'):
+        """Diff a tracemalloc snapshot against the baseline, tracing starts with the first call or with baseline=1."""
+        import tracemalloc
+        if stop:
+            tracemalloc.stop()
+            Dev.memory_baseline = None
+            return '<pre>tracemalloc stopped</pre>'
+        if group not in ('lineno', 'filename', 'traceback'):
+            raise cherrypy.HTTPError(400, 'Unknown grouping %s'%group)
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise cherrypy.HTTPError(400, 'Could not parse limit=%s'%limit)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_TRACE_FRAMES)
+            Dev.memory_baseline = None
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ])
+        if baseline or Dev.memory_baseline is None:
+            Dev.memory_baseline = snapshot
+            return '<pre>new baseline with %d traced blocks, reload to diff against it</pre>'%len(snapshot.traces)
+        current, peak = tracemalloc.get_traced_memory()
+        lines = ['traced %.1fMB, peak %.1fMB'%(current/2**20, peak/2**20), '']
+        for stat in snapshot.compare_to(Dev.memory_baseline, group)[:limit]:
+            lines.append(str(stat))
+            if group == 'traceback':
+                lines.extend('    '+l for l in stat.traceback.format())
+        return '<pre>%s</pre>'%html.escape('\n'.join(lines))
 
-    @staticmethod
-    def get_token(code=None):
+    @cherrypy.expose
+    def objgraph(self):
+        import objgraph
+        return '<br>'.join(map(str,objgraph.most_common_types(limit=300)))
+    @cherrypy.expose
+    def dbpool(self):
+        return '<pre>%s</pre>'%json.dumps(pool.stats(), indent=4)
+    @cherrypy.expose
+    def log(self, lines='1000', level='DEBUG', q=''):
+        """The last log records, at or above `level` and containing `q`, read backwards from the end of the log."""
+        try:
+            n = int(lines)
+        except ValueError:
+            raise cherrypy.HTTPError(400, 'Could not parse lines=%s'%lines)
+        minlevel = logging.getLevelName(level.upper())
+        if not isinstance(minlevel, int):
+            raise cherrypy.HTTPError(400, 'Unknown level %s'%level)
+        records = tail_log(logfile, n, minlevel, q)
+        return '<pre>%s</pre>'%html.escape('\n'.join(records))
+
+
+ZOOM_API_URL = 'https://api.zoom.us/v2'
+ZOOM_OAUTH_URL = 'https://zoom.us/oauth'
+ZOOM_TIMEOUT = (10, 60) # seconds to connect and to wait for a response
+ZOOM_TOKEN_MARGIN = 300 # seconds before its expiry at which the access token is refreshed
+
+class ZoomClient:
+    """Zoom API client with a cached access token and one keep-alive session.
+
+    The token is refreshed only when it is about to expire or when Zoom
+    answers with 401. Threads that need a new token at the same time wait
+    for a single refresh instead of each doing their own."""
+    def __init__(self, api_url=ZOOM_API_URL, oauth_url=ZOOM_OAUTH_URL):
+        self.api_url = api_url
+        self.oauth_url = oauth_url
+        self._session = None # created on first use, importing requests is slow
+        self.lock = threading.Lock()
+        self.expires = 0 # time.monotonic() after which the token is refreshed, unknown (0) after a restart
+
+    @property
+    def session(self):
+        if self._session is None: # two threads may both create one, the last one is kept
+            import requests
+            self._session = requests.Session()
+        return self._session
+
+    def get_token(self, code=None):
         clientid = conf('zoom.clientid')
         clientsecret = conf('zoom.clientsecret')
         redirecturl = 'https://'+conf('server.url')+'/zoom/receive_code'
@@ -942,42 +2705,60 @@ class Zoom:
             grant_type = 'grant_type=authorization_code&code='+code
         else:
             grant_type = 'grant_type=refresh_token&refresh_token='+refresh_token
-        url = 'https://zoom.us/oauth/token?' + grant_type + '&client_id=' + clientid + '&client_secret=' + clientsecret + '&redirect_uri=' + redirecturl
-        r = requests.post(url)
+        url = self.oauth_url+'/token?' + grant_type + '&client_id=' + clientid + '&client_secret=' + clientsecret + '&redirect_uri=' + redirecturl
+        with timed('zoom', 'token'):
+            r = self.session.post(url, timeout=ZOOM_TIMEOUT)
         j = r.json()
         updateconf('zoom.accesstoken', j.get('access_token', access_token))
         updateconf('zoom.refreshtoken', j.get('refresh_token',refresh_token))
+        if 'access_token' in j:
+            self.expires = time.monotonic() + j.get('expires_in', 3600) - ZOOM_TOKEN_MARGIN
         return j
 
+    def access_token(self):
+        if time.monotonic() >= self.expires:
+            with self.lock:
+                if time.monotonic() >= self.expires: # not already refreshed by the thread holding the lock before us
+                    self.get_token()
+        return conf('zoom.accesstoken')
+
+    def expire(self, token):
+        with self.lock:
+            if token == conf('zoom.accesstoken'): # otherwise it was already replaced
+                self.expires = 0
+
+    def request(self, method, r, **kwargs):
+        for attempt in range(2):
+            token = self.access_token()
+            with timed('zoom', method):
+                response = self.session.request(method, self.api_url+r, headers={'Authorization': 'Bearer '+token}, timeout=ZOOM_TIMEOUT, **kwargs)
+            if response.status_code != 401:
+                break
+            self.expire(token)
+        return response
+
+zoom_client = ZoomClient(api_url=conf('zoom.apiurl', ZOOM_API_URL), oauth_url=conf('zoom.oauthurl', ZOOM_OAUTH_URL))
+
+class Zoom:
+    @cherrypy.expose
+    def index(self):
+        return "Zoom integration is controlled from the admin panel."
+
     @staticmethod
-    def get_session():
-        Zoom.get_token() # TODO refresh only on errors
-        clientid = conf('zoom.clientid')
-        clientsecret = conf('zoom.clientsecret')
-        access_token = conf('zoom.accesstoken')
-        session = rauth.OAuth2Session(
-           client_id=clientid,
-           client_secret=clientsecret,
-           access_token=access_token)
-        return session
+    def get_token(code=None):
+        return zoom_client.get_token(code=code)
 
-    @staticmethod 
+    @staticmethod
     def get(r, params={}):
-        base_url='https://api.zoom.us/v2'
-        s = Zoom.get_session()
-        return s.get(base_url+r, params=params)
+        return zoom_client.request('GET', r, params=params)
 
-    @staticmethod 
+    @staticmethod
     def post(r, data={}):
-        base_url='https://api.zoom.us/v2'
-        s = Zoom.get_session()
-        return s.post(base_url+r, json=data)
+        return zoom_client.request('POST', r, json=data)
 
-    @staticmethod # TODO not tested
+    @staticmethod
     def patch(r, data={}):
-        base_url='https://api.zoom.us/v2'
-        s = Zoom.get_session()
-        return s.patch(base_url+r, json=data)
+        return zoom_client.request('PATCH', r, json=data)
 
     @staticmethod
     def start_auth():
@@ -997,30 +2778,39 @@ class Zoom:
 
 
 def auth(realm,u,p):
-    log.info('attempting to access protected area %s'%((realm,u,p),))
-    return p==conf('admin.pass') and u==conf('admin.user')
+    if p==conf('admin.pass') and u==conf('admin.user'):
+        return True
+    log.warning('failed login to %s as %s'%(realm,u))
+    return False
 
 def sysauth(realm,u,p):
-    log.info('attempting to access protected area %s'%((realm,u,p),))
-    return p==conf('sysadmin.pass') and u==conf('sysadmin.user')
+    if p==conf('sysadmin.pass') and u==conf('sysadmin.user'):
+        return True
+    log.warning('failed login to %s as %s'%(realm,u))
+    return False
 
 def allauth(realm,u,p):
-    log.info('attempting to access protected area %s'%((realm,u,p),))
-    return p==conf('server.allpass') and u==conf('server.alluser')
+    if p==conf('server.allpass') and u==conf('server.alluser'):
+        return True
+    log.warning('failed login to %s as %s'%(realm,u))
+    return False
 
-if __name__ == '__main__':
-    log.info('server starting')
-    log.info(f'using port {conf("server.port")}')
+def setup_server(settings={}):
+    """Configure CherryPy, mount the apps and subscribe the background workers, `settings` override the global CherryPy config."""
     cherrypy.config.update({'server.socket_host'     : '0.0.0.0',
+                            'tools.metrics.on'       : True,
+                            'tools.profiler.on'      : True,
                             'server.socket_port'     : conf('server.port'),
                             'tools.encode.on'        : True,
                             'environment'            : 'production',
                             'tools.sessions.on'      : True,
                             'tools.sessions.timeout' : 60,
                             'tools.caching.on'       : False,
+                            **settings,
                            })
 
     static_conf = {'/static':{
+                              'tools.assets.on'      : True,
                               'tools.staticdir.on'   : True,
                               'tools.staticdir.dir'  : '',
                               'tools.staticdir.root' : os.path.join(os.path.dirname(os.path.realpath(__file__)),'static'),
@@ -1070,9 +2860,20 @@ if __name__ == '__main__':
     cherrypy.tree.mount(SysAdmin(), '/sysadmin', sys_password_conf)
     cherrypy.tree.mount(Dev(), '/dev', sys_password_conf)
     cherrypy.tree.mount(Zoom(), '/zoom', {})
-    for (f,t) in scheduled_events:
-        threading.Thread(target=f).start() # run it once at the start
-        Monitor(cherrypy.engine, f, frequency=t).subscribe() # schedule future runs
+    cherrypy.engine.subscribe('start', outbox.start)
+    cherrypy.engine.subscribe('stop', outbox.stop)
+    cherrypy.engine.subscribe('start', recordings.start)
+    cherrypy.engine.subscribe('stop', recordings.stop)
+    cherrypy.engine.subscribe('start', exporter.start)
+    cherrypy.engine.subscribe('stop', exporter.stop)
+    cherrypy.engine.subscribe('start', lambda: threading.Thread(target=compile_templates, daemon=True).start())
+
+if __name__ == '__main__':
+    log.info('server starting')
+    log.info(f'using port {conf("server.port")}')
+    setup_server()
+    cherrypy.engine.subscribe('start', scheduler.start)
+    cherrypy.engine.subscribe('stop', scheduler.stop)
     cherrypy.engine.start()
     cherrypy.engine.block()
     log.info('server stoped')
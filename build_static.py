@@ -0,0 +1,75 @@
+"""Fingerprint and precompress the files in static/ for serving with far-future cache headers.
+
+Every file is copied to static_build/ with a hash of its content in its
+name (bootstrap.min.css becomes bootstrap.min.1a2b3c4d5e.css), next to
+gzip and, if the brotli module or command is available, brotli versions
+of the text files. static_build/manifest.json maps the original names to
+the fingerprinted ones, the server and the `static_url` template helper
+read it at startup. Run again (and restart the server) after changing a
+file in static/."""
+
+import gzip
+import hashlib
+import json
+import os
+import os.path
+import shutil
+import subprocess
+
+file_dir = os.path.dirname(os.path.realpath(__file__))
+STATIC = os.path.join(file_dir, 'static')
+BUILD = os.path.join(file_dir, 'static_build')
+COMPRESSIBLE = {'.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.ttf', '.eot'}
+HASH_LENGTH = 10
+
+try:
+    import brotli
+    def compress_brotli(data):
+        return brotli.compress(data, quality=11)
+except ImportError:
+    if shutil.which('brotli'):
+        def compress_brotli(data):
+            return subprocess.run(['brotli', '-c', '-q', '11'], input=data, stdout=subprocess.PIPE, check=True).stdout
+    else:
+        compress_brotli = None
+
+def fingerprinted(name, data):
+    root, ext = os.path.splitext(name)
+    return '%s.%s%s'%(root, hashlib.sha256(data).hexdigest()[:HASH_LENGTH], ext)
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def build():
+    if os.path.exists(BUILD):
+        shutil.rmtree(BUILD)
+    manifest = {}
+    sizes = [0, 0, 0]
+    for dirpath, dirnames, filenames in os.walk(STATIC):
+        for filename in sorted(filenames):
+            name = os.path.relpath(os.path.join(dirpath, filename), STATIC).replace(os.sep, '/')
+            with open(os.path.join(dirpath, filename), 'rb') as f:
+                data = f.read()
+            target = fingerprinted(name, data)
+            manifest[name] = target
+            write(os.path.join(BUILD, target), data)
+            gz = br = data
+            if os.path.splitext(name)[1] in COMPRESSIBLE:
+                gz = gzip.compress(data, compresslevel=9, mtime=0)
+                if len(gz) < len(data):
+                    write(os.path.join(BUILD, target+'.gz'), gz)
+                br = compress_brotli(data) if compress_brotli else data
+                if len(br) < len(data):
+                    write(os.path.join(BUILD, target+'.br'), br)
+            for i, d in enumerate((data, gz, br)): # what is sent to clients that accept each encoding
+                sizes[i] += min(len(d), len(data))
+    with open(os.path.join(BUILD, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest, sizes
+
+if __name__ == '__main__':
+    manifest, (plain, gz, br) = build()
+    print('%d files, %.1fMB, %.1fMB as gzip%s'%(len(manifest), plain/2**20, gz/2**20,
+          ', %.1fMB as brotli'%(br/2**20) if compress_brotli else ' (install brotli for .br files)'))
@@ -54,3 +54,4 @@ CREATE TABLE applications
  -- TODO maybe CHECK that dates has the correct format and refers to events that exist
 )
 SQL
+sh $(dirname "$0")/migrate_db.sh database.sqlite
@@ -10,7 +10,6 @@ import sqlite3
 
 import dateutil
 import dateutil.parser
-import rauth
 import requests
 
 file_dir = os.path.dirname(os.path.realpath(__file__))
@@ -30,7 +29,6 @@ _, dl_folder, *all_meetings = sys.argv
 
 from briefings_server import Zoom
 
-s = Zoom.get_session()
 for m in all_meetings:
     print(m)
     config = {"recording_authentication": False}
@@ -0,0 +1,335 @@
+"""Local stand-ins for the external services used by `briefings_server.py`.
+
+They speak just enough of each protocol for the server's workflows and
+record every call, so that benchmarks can count round trips. Latency and
+failures can be injected to see how the server copes with a slow or flaky
+dependency.
+
+Run as `python fakes.py CONFIG_SQLITE [--latency S] [--error-rate P]` to
+serve all of them and point the config at them (restart the server after)."""
+
+import argparse
+import collections
+import email
+import email.policy
+import http.server
+import json
+import os.path
+import random
+import socketserver
+import sqlite3
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.parse
+
+class Fake:
+    """Latency and error injection, the attributes can be changed while the fake is running.
+
+    Every call waits `latency` plus up to `jitter` seconds and fails with
+    probability `error_rate`."""
+    def __init__(self, latency=0, jitter=0, error_rate=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.server = None
+
+    def inject(self):
+        """Wait for the injected latency and return whether this call should fail."""
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        return random.random() < self.error_rate
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class FakeService(Fake):
+    """A threaded HTTP/1.1 (keep-alive) server recording the calls made to it as (time, method, path, status)."""
+    error_status = 503
+
+    def __init__(self, **faults):
+        super().__init__(**faults)
+        self.calls = []
+
+    def start(self, host='127.0.0.1', port=0):
+        service = self
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            def setup(self):
+                super().setup()
+                with service.lock:
+                    service.connections += 1
+            def handle_one_request(self):
+                self.raw_requestline = self.rfile.readline(65537)
+                if not self.raw_requestline or not self.parse_request():
+                    self.close_connection = True
+                    return
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length) if length else b''
+                url = urllib.parse.urlsplit(self.path)
+                if service.inject():
+                    status, headers, content = service.error_status, {}, b'injected failure'
+                else:
+                    status, headers, content = service.handle(self.command, url.path, urllib.parse.parse_qs(url.query), self.headers, body)
+                service.record(self.command, url.path, status)
+                self.send_response(status)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(content)
+                self.wfile.flush()
+            def log_message(self, *args):
+                pass
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return 'http://%s:%d'%(host, port)
+
+    def record(self, method, path, status):
+        with self.lock:
+            self.calls.append((time.time(), method, path, status))
+
+    def count(self, prefix=''):
+        with self.lock:
+            return sum(1 for t, method, path, status in self.calls if path.startswith(prefix))
+
+    def reset(self):
+        with self.lock:
+            self.calls.clear()
+            self.connections = 0
+
+    def handle(self, method, path, query, headers, body):
+        return 404, {}, b''
+
+def json_response(status, j):
+    return status, {'Content-Type': 'application/json'}, json.dumps(j).encode()
+
+class FakeZoom(FakeService):
+    """The OAuth token endpoint (under /oauth) and the parts of the v2 API (under /v2) used by the server.
+
+    Meetings get recordings right away and `/rec/download/<meetingid>`
+    serves `recording_size` bytes, honoring Range requests."""
+    def __init__(self, token_lifetime=3600, recording_size=1024*1024, **faults):
+        super().__init__(**faults)
+        self.token_lifetime = token_lifetime
+        self.recording_size = recording_size
+        self.tokens = 0
+        self.meetings = collections.OrderedDict()
+
+    @property
+    def token(self):
+        return 'token-%d'%self.tokens
+
+    def expire_token(self):
+        with self.lock:
+            self.tokens += 1
+
+    def recording(self, meetingid):
+        return bytes(i%251 for i in range(self.recording_size))
+
+    def handle(self, method, path, query, headers, body):
+        if path == '/oauth/token' and method == 'POST':
+            with self.lock:
+                self.tokens += 1
+            return json_response(200, {'access_token': self.token, 'refresh_token': 'refresh-%d'%self.tokens,
+                                       'token_type': 'bearer', 'expires_in': self.token_lifetime})
+        if path.startswith('/rec/download/'):
+            data = self.recording(path.split('/')[-1])
+            if 'Range' in headers:
+                start = int(headers['Range'].split('=')[1].split('-')[0])
+                return 206, {'Content-Range': 'bytes %d-%d/%d'%(start, len(data)-1, len(data))}, data[start:]
+            return 200, {}, data
+        if headers.get('Authorization') != 'Bearer '+self.token:
+            return json_response(401, {'code': 124, 'message': 'Invalid access token.'})
+        parts = path.strip('/').split('/')
+        if parts == ['v2', 'users', 'me'] and method == 'GET':
+            return json_response(200, {'id': 'me', 'email': 'host@example.com'})
+        if parts == ['v2', 'users', 'me', 'meetings'] and method == 'POST':
+            meetingid = str(len(self.meetings)+1000)
+            self.meetings[meetingid] = json.loads(body or b'{}')
+            return json_response(201, {'id': int(meetingid), 'join_url': 'https://zoom.example.com/j/%s'%meetingid})
+        if parts[:2] == ['v2', 'meetings'] and parts[3:] == ['recordings', 'settings'] and method == 'PATCH':
+            return 204, {}, b''
+        if parts[:2] == ['v2', 'meetings'] and parts[3:] == ['recordings'] and method == 'GET':
+            meetingid = parts[2]
+            return json_response(200, {'id': meetingid, 'recording_files': [
+                {'recording_type': 'shared_screen_with_speaker_view', 'file_type': 'MP4',
+                 'file_size': self.recording_size, 'download_url': self.url+'/rec/download/'+meetingid},
+                {'recording_type': 'audio_only', 'file_type': 'M4A',
+                 'file_size': self.recording_size//10, 'download_url': self.url+'/rec/download/'+meetingid+'-audio'}]})
+        return json_response(404, {'code': 3001, 'message': 'Not found.'})
+
+class FakeEtherpad(FakeService):
+    """The Etherpad HTTP API (under /api/<version>/), pads are kept as HTML in memory."""
+    def __init__(self, **faults):
+        super().__init__(**faults)
+        self.pads = {}
+
+    def handle(self, method, path, query, headers, body):
+        params = {k: v[0] for k, v in {**query, **urllib.parse.parse_qs(body.decode())}.items()}
+        function = path.rstrip('/').split('/')[-1]
+        padid = params.get('padID')
+        with self.lock:
+            if function == 'createPad':
+                if padid in self.pads:
+                    return json_response(200, {'code': 1, 'message': 'padID does already exist', 'data': None})
+                self.pads[padid] = params.get('text', '')
+                return json_response(200, {'code': 0, 'message': 'ok', 'data': None})
+            if function in ('getHTML', 'getText'):
+                return json_response(200, {'code': 0, 'message': 'ok', 'data': {function[3:].lower(): self.pads.get(padid, '<p>%s</p>'%padid)}})
+            if function in ('setHTML', 'setText'):
+                self.pads[padid] = params.get(function[3:].lower(), '')
+                return json_response(200, {'code': 0, 'message': 'ok', 'data': None})
+        return json_response(200, {'code': 3, 'message': 'no such function', 'data': None})
+
+def self_signed_certificate(folder):
+    """Create a throwaway key and certificate for localhost with `openssl`, return the path of the combined PEM file."""
+    pem = os.path.join(folder, 'localhost.pem')
+    subprocess.check_call(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '2', '-subj', '/CN=localhost',
+                           '-keyout', pem, '-out', pem+'.crt'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    with open(pem, 'a') as f, open(pem+'.crt') as crt:
+        f.write(crt.read())
+    return pem
+
+class FakeSMTP(Fake):
+    """An SMTP server with STARTTLS and AUTH PLAIN/LOGIN accepting any credentials, delivered messages are kept in `messages`.
+
+    Latency is injected before every reply, failures reject the message after DATA."""
+    def __init__(self, **faults):
+        super().__init__(**faults)
+        self.messages = []
+        self.rejected = 0
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(self_signed_certificate(tempfile.mkdtemp()))
+
+    def start(self, host='127.0.0.1', port=0):
+        service = self
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                if service.latency or service.jitter:
+                    time.sleep(service.latency + random.uniform(0, service.jitter))
+                self.wfile.write(line.encode()+b'\r\n')
+                self.wfile.flush()
+            def handle(self):
+                with service.lock:
+                    service.connections += 1
+                self.reply('220 localhost fake ESMTP')
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode().strip()
+                    verb = command.split(' ')[0].upper()
+                    if verb == 'EHLO':
+                        self.reply('250-localhost\r\n250-8BITMIME\r\n250-SIZE 52428800\r\n'
+                                   +('250-AUTH PLAIN LOGIN\r\n' if isinstance(self.connection, ssl.SSLSocket) else '250-STARTTLS\r\n')
+                                   +'250 SMTPUTF8')
+                    elif verb == 'HELO':
+                        self.reply('250 localhost')
+                    elif verb == 'STARTTLS':
+                        self.reply('220 ready to start TLS')
+                        self.connection = self.request = service.context.wrap_socket(self.connection, server_side=True)
+                        self.setup()
+                    elif verb == 'AUTH':
+                        if command.upper().startswith('AUTH LOGIN'):
+                            for prompt in ('VXNlcm5hbWU6', 'UGFzc3dvcmQ6'): # "Username:" and "Password:"
+                                self.reply('334 '+prompt)
+                                self.rfile.readline()
+                        self.reply('235 authentication succeeded')
+                    elif verb in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                        self.reply('250 ok')
+                    elif verb == 'DATA':
+                        self.reply('354 end data with <CR><LF>.<CR><LF>')
+                        lines = []
+                        while True:
+                            line = self.rfile.readline()
+                            if line in (b'.\r\n', b''):
+                                break
+                            lines.append(line[1:] if line.startswith(b'..') else line)
+                        if random.random() < service.error_rate:
+                            with service.lock:
+                                service.rejected += 1
+                            self.reply('451 4.3.0 injected failure')
+                            continue
+                        with service.lock:
+                            service.messages.append(email.message_from_bytes(b''.join(lines).replace(b'\r\n', b'\n'), policy=email.policy.default))
+                        self.reply('250 queued')
+                    elif verb == 'QUIT':
+                        self.reply('221 bye')
+                        return
+                    else:
+                        self.reply('502 command not implemented')
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def address(self):
+        return self.server.server_address[:2]
+
+class FakeTwitter(FakeService):
+    """The media upload (v1.1) and tweet (v2) endpoints, OAuth signatures are not checked. Tweets are kept in `tweets`."""
+    def __init__(self, **faults):
+        super().__init__(**faults)
+        self.tweets = []
+        self.media = 0
+
+    def handle(self, method, path, query, headers, body):
+        with self.lock:
+            if path == '/1.1/media/upload.json' and method == 'POST':
+                self.media += 1
+                return json_response(200, {'media_id': self.media, 'media_id_string': str(self.media)})
+            if path == '/2/tweets' and method == 'POST':
+                self.tweets.append(json.loads(body))
+                return json_response(201, {'data': {'id': str(len(self.tweets)), 'text': self.tweets[-1]['text']}})
+        return json_response(404, {'errors': [{'message': 'Sorry, that page does not exist'}]})
+
+def configure(config, smtp, zoom, etherpad, twitter):
+    """Point the config sqlite file at the fakes, adding the keys that older config files do not have."""
+    values = {'email.SMTPhost': smtp.address[0], 'email.SMTPport': str(smtp.address[1]),
+              'zoom.apiurl': zoom.url+'/v2', 'zoom.oauthurl': zoom.url+'/oauth',
+              'etherpad.url': etherpad.url,
+              'twitter.apiurl': twitter.url, 'twitter.uploadurl': twitter.url}
+    with sqlite3.connect(config) as c:
+        for k, v in values.items():
+            if not c.execute('UPDATE config SET value=? WHERE key=?', (v, k)).rowcount:
+                c.execute("INSERT INTO config (key, value, valuetype, help, access_level) VALUES (?,?,'str','Set by fakes.py','sysadmin')", (k, v))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve all the fakes and point a config sqlite file at them.')
+    parser.add_argument('config')
+    parser.add_argument('--latency', type=float, default=0, help='seconds added to every call')
+    parser.add_argument('--jitter', type=float, default=0, help='up to this many more seconds, at random')
+    parser.add_argument('--error-rate', type=float, default=0, help='probability of a call failing')
+    args = parser.parse_args()
+    faults = {'latency': args.latency, 'jitter': args.jitter, 'error_rate': args.error_rate}
+    fakes = {'smtp': FakeSMTP(**faults), 'zoom': FakeZoom(**faults), 'etherpad': FakeEtherpad(**faults), 'twitter': FakeTwitter(**faults)}
+    for fake in fakes.values():
+        fake.start()
+    configure(args.config, **fakes)
+    print('SMTP on %s:%d, Zoom on %s, Etherpad on %s, Twitter on %s'%(fakes['smtp'].address+(fakes['zoom'].url, fakes['etherpad'].url, fakes['twitter'].url)))
+    print('%s now points at them, restart the server. Stop with Ctrl-C.'%args.config)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    print('emails: %d delivered, %d rejected'%(len(fakes['smtp'].messages), fakes['smtp'].rejected))
+    for name in ('zoom', 'etherpad', 'twitter'):
+        calls = collections.Counter((method, path.rstrip('0123456789'), status) for t, method, path, status in fakes[name].calls)
+        for (method, path, status), n in sorted(calls.items()):
+            print('%s: %d x %s %s -> %d'%(name, n, method, path, status))
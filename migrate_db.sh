@@ -0,0 +1,12 @@
+#!/bin/sh
+# Apply the migrations in ./migrations that are newer than the `user_version` of the database.
+filename=$1
+migrations=$(dirname "$0")/migrations
+version=$(sqlite3 $filename 'PRAGMA user_version;')
+for migration in $(ls $migrations/*.sql | sort); do
+    number=$(basename $migration | cut -d_ -f1 | sed 's/^0*//')
+    if [ "$number" -gt "$version" ]; then
+        echo "applying $migration"
+        (echo "BEGIN;"; cat $migration; echo "PRAGMA user_version = $number;"; echo "COMMIT;") | sqlite3 -bail $filename || exit 1
+    fi
+done
@@ -0,0 +1,11 @@
+-- Indexes for the date windows of the public pages and for the admin joins.
+
+CREATE INDEX events_warmup_date ON events(warmup, date);
+
+-- talks whose recordings still need to be downloaded (check_recordings_and_download)
+CREATE INDEX events_pending_recordings ON events(date) WHERE recording_processed=0 AND recording_consent=1;
+
+-- covers the LEFT JOIN in Admin.eventstatus
+CREATE INDEX invitations_confirmed_date ON invitations(confirmed_date, warmup, uuid);
+
+CREATE INDEX applications_pending ON applications(declined, confirmed_date);
@@ -0,0 +1,19 @@
+-- A version counter and modification time for the events table, used for the ETag and Last-Modified headers.
+
+CREATE TABLE data_versions
+(name TEXT PRIMARY KEY,
+ version INTEGER NOT NULL DEFAULT 0,
+ modified TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO data_versions (name) VALUES ('events');
+
+CREATE TRIGGER events_version_insert AFTER INSERT ON events BEGIN
+    UPDATE data_versions SET version=version+1, modified=CURRENT_TIMESTAMP WHERE name='events';
+END;
+CREATE TRIGGER events_version_update AFTER UPDATE ON events BEGIN
+    UPDATE data_versions SET version=version+1, modified=CURRENT_TIMESTAMP WHERE name='events';
+END;
+CREATE TRIGGER events_version_delete AFTER DELETE ON events BEGIN
+    UPDATE data_versions SET version=version+1, modified=CURRENT_TIMESTAMP WHERE name='events';
+END;
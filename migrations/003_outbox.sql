@@ -0,0 +1,21 @@
+-- Durable queue of outgoing emails, drained by the sender threads of `EmailOutbox`.
+
+CREATE TABLE outbox
+(id INTEGER PRIMARY KEY,
+ created TIMESTAMP NOT NULL,
+ subject TEXT NOT NULL,
+ recipient TEXT NOT NULL,
+ message BLOB NOT NULL, -- the serialized email.message.EmailMessage, including the Bcc header
+ status TEXT NOT NULL DEFAULT 'pending', -- pending, sending, sent or dead
+ attempts INT NOT NULL DEFAULT 0,
+ next_attempt TIMESTAMP NOT NULL,
+ last_error TEXT,
+ sent TIMESTAMP,
+ -- set for talk announcements: events.announced is raised to announce_level once all of them are sent
+ announce_date TIMESTAMP,
+ announce_warmup BOOLEAN,
+ announce_level INT
+);
+
+CREATE INDEX outbox_due ON outbox(status, next_attempt);
+CREATE INDEX outbox_announcements ON outbox(announce_date, announce_warmup, announce_level);
@@ -0,0 +1,19 @@
+-- Progress of the recording downloads and transcodes, see `RecordingJobs`.
+
+CREATE TABLE recording_jobs
+(date TIMESTAMP NOT NULL,
+ warmup BOOLEAN NOT NULL,
+ stage TEXT NOT NULL DEFAULT 'metadata', -- metadata, download, verify, transcode, done or failed
+ status TEXT NOT NULL DEFAULT 'waiting', -- waiting or running
+ download_url TEXT,
+ file_size INT,
+ bytes_done INT NOT NULL DEFAULT 0,
+ attempts INT NOT NULL DEFAULT 0, -- failed attempts at the current stage
+ next_attempt TIMESTAMP NOT NULL,
+ last_error TEXT,
+ updated TIMESTAMP,
+ PRIMARY KEY (date, warmup),
+ FOREIGN KEY(date, warmup) REFERENCES events(date, warmup) ON DELETE CASCADE
+);
+
+CREATE INDEX recording_jobs_due ON recording_jobs(stage, status, next_attempt);
@@ -0,0 +1,100 @@
+-- One row per proposed date of an invitation or application, replacing the `dates` column
+-- that held `repr(datetime)` strings joined with '|'. The dates are stored the way the
+-- sqlite3 module stores datetimes, so they compare equal to `events.date`.
+
+CREATE TABLE invitation_dates
+(uuid TEXT NOT NULL,
+ date TIMESTAMP NOT NULL,
+ PRIMARY KEY (uuid, date),
+ FOREIGN KEY(uuid) REFERENCES invitations(uuid) ON DELETE CASCADE
+);
+
+CREATE INDEX invitation_dates_date ON invitation_dates(date, uuid);
+
+CREATE TABLE application_dates
+(uuid TEXT NOT NULL,
+ date TIMESTAMP NOT NULL,
+ PRIMARY KEY (uuid, date),
+ FOREIGN KEY(uuid) REFERENCES applications(uuid) ON DELETE CASCADE
+);
+
+CREATE INDEX application_dates_date ON application_dates(date, uuid);
+
+INSERT OR IGNORE INTO invitation_dates (uuid, date)
+WITH RECURSIVE
+-- 'datetime.datetime(2021, 10, 13, 11, 0)|datetime.datetime(2021, 10, 20, 11, 0)' -> one item per date
+items(uuid, item, rest) AS (
+  SELECT uuid, '', dates||'|' FROM invitations
+  UNION ALL
+  SELECT uuid, substr(rest, 1, instr(rest, '|')-1), substr(rest, instr(rest, '|')+1) FROM items WHERE rest!=''
+),
+-- 'datetime.datetime(2021, 10, 13, 11, 0)' -> year, month, day, hour, minute[, second[, microsecond]]
+parts(uuid, item, i, part, rest) AS (
+  SELECT uuid, item, 0, NULL, replace(replace(item, 'datetime.datetime(', ''), ')', '')||',' FROM items WHERE item!=''
+  UNION ALL
+  SELECT uuid, item, i+1, CAST(trim(substr(rest, 1, instr(rest, ',')-1)) AS INT), substr(rest, instr(rest, ',')+1) FROM parts WHERE rest!=''
+)
+SELECT uuid,
+       printf('%04d-%02d-%02d %02d:%02d:%02d',
+              max(CASE i WHEN 1 THEN part END), max(CASE i WHEN 2 THEN part END), max(CASE i WHEN 3 THEN part END),
+              max(CASE i WHEN 4 THEN part END), max(CASE i WHEN 5 THEN part END), max(CASE i WHEN 6 THEN part END))
+       || CASE WHEN max(CASE i WHEN 7 THEN part END) THEN printf('.%06d', max(CASE i WHEN 7 THEN part END)) ELSE '' END
+FROM parts GROUP BY uuid, item;
+
+INSERT OR IGNORE INTO application_dates (uuid, date)
+WITH RECURSIVE
+-- 'datetime.datetime(2021, 10, 13, 11, 0)|datetime.datetime(2021, 10, 20, 11, 0)' -> one item per date
+items(uuid, item, rest) AS (
+  SELECT uuid, '', dates||'|' FROM applications
+  UNION ALL
+  SELECT uuid, substr(rest, 1, instr(rest, '|')-1), substr(rest, instr(rest, '|')+1) FROM items WHERE rest!=''
+),
+-- 'datetime.datetime(2021, 10, 13, 11, 0)' -> year, month, day, hour, minute[, second[, microsecond]]
+parts(uuid, item, i, part, rest) AS (
+  SELECT uuid, item, 0, NULL, replace(replace(item, 'datetime.datetime(', ''), ')', '')||',' FROM items WHERE item!=''
+  UNION ALL
+  SELECT uuid, item, i+1, CAST(trim(substr(rest, 1, instr(rest, ',')-1)) AS INT), substr(rest, instr(rest, ',')+1) FROM parts WHERE rest!=''
+)
+SELECT uuid,
+       printf('%04d-%02d-%02d %02d:%02d:%02d',
+              max(CASE i WHEN 1 THEN part END), max(CASE i WHEN 2 THEN part END), max(CASE i WHEN 3 THEN part END),
+              max(CASE i WHEN 4 THEN part END), max(CASE i WHEN 5 THEN part END), max(CASE i WHEN 6 THEN part END))
+       || CASE WHEN max(CASE i WHEN 7 THEN part END) THEN printf('.%06d', max(CASE i WHEN 7 THEN part END)) ELSE '' END
+FROM parts GROUP BY uuid, item;
+
+-- SQLite 3.27 has no DROP COLUMN, so the tables are rebuilt without `dates`.
+CREATE TABLE invitations_new
+(uuid TEXT PRIMARY KEY,
+ email NOT NULL,
+ warmup BOOLEAN NOT NULL,
+ confirmed_date TIMESTAMP,
+ host TEXT,
+ host_email TEXT,
+ location TEXT,
+ FOREIGN KEY(confirmed_date, warmup) REFERENCES events(date, warmup)
+);
+INSERT INTO invitations_new (rowid, uuid, email, warmup, confirmed_date, host, host_email, location)
+SELECT rowid, uuid, email, warmup, confirmed_date, host, host_email, location FROM invitations;
+DROP TABLE invitations;
+ALTER TABLE invitations_new RENAME TO invitations;
+CREATE INDEX invitations_confirmed_date ON invitations(confirmed_date, warmup, uuid);
+
+CREATE TABLE applications_new
+(uuid TEXT PRIMARY KEY,
+ speaker TEXT NOT NULL,
+ affiliation TEXT NOT NULL,
+ bio TEXT NOT NULL,
+ title TEXT NOT NULL,
+ abstract TEXT NOT NULL,
+ warmup BOOLEAN NOT NULL,
+ email TEXT,
+ previous_records TEXT,
+ confirmed_date TIMESTAMP,
+ declined BOOLEAN DEFAULT 0, -- TODO CHECK that declined and confirmed_date are not on at the same time
+ FOREIGN KEY(confirmed_date, warmup) REFERENCES events(date, warmup)
+);
+INSERT INTO applications_new (rowid, uuid, speaker, affiliation, bio, title, abstract, warmup, email, previous_records, confirmed_date, declined)
+SELECT rowid, uuid, speaker, affiliation, bio, title, abstract, warmup, email, previous_records, confirmed_date, declined FROM applications;
+DROP TABLE applications;
+ALTER TABLE applications_new RENAME TO applications;
+CREATE INDEX applications_pending ON applications(declined, confirmed_date);
@@ -0,0 +1,12 @@
+-- Materialized state of every invitation for /admin/invitestatus: 'accepted' once a date is
+-- confirmed, otherwise 'pending' or 'expired' depending on whether `last_date`, the latest
+-- proposed date, is still `invitations.neededdays` away. Kept up to date by `expire_invitations`.
+
+ALTER TABLE invitations ADD COLUMN status TEXT NOT NULL DEFAULT 'pending';
+ALTER TABLE invitations ADD COLUMN last_date TIMESTAMP;
+
+UPDATE invitations SET
+  status = CASE WHEN confirmed_date IS NOT NULL THEN 'accepted' ELSE 'pending' END,
+  last_date = (SELECT max(date) FROM invitation_dates WHERE invitation_dates.uuid=invitations.uuid);
+
+CREATE INDEX invitations_status ON invitations(status, last_date);
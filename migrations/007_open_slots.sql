@@ -0,0 +1,37 @@
+-- Main talks that do not have a warmup talk yet, offered on /apply. Maintained by the triggers
+-- below, so it changes in the same transaction as `events`. Applications do not take a slot,
+-- only the warmup event created when one is accepted does.
+
+CREATE TABLE open_slots
+(date TIMESTAMP PRIMARY KEY,
+ speaker TEXT,
+ title TEXT
+);
+
+INSERT INTO open_slots (date, speaker, title)
+SELECT date, speaker, title FROM events AS main
+WHERE warmup=0 AND NOT EXISTS (SELECT 1 FROM events AS w WHERE w.date=main.date AND w.warmup!=0);
+
+CREATE TRIGGER open_slots_insert AFTER INSERT ON events
+BEGIN
+  DELETE FROM open_slots WHERE date=NEW.date;
+  INSERT INTO open_slots (date, speaker, title)
+  SELECT date, speaker, title FROM events AS main
+  WHERE date=NEW.date AND warmup=0 AND NOT EXISTS (SELECT 1 FROM events AS w WHERE w.date=main.date AND w.warmup!=0);
+END;
+
+CREATE TRIGGER open_slots_update AFTER UPDATE OF date, warmup, speaker, title ON events
+BEGIN
+  DELETE FROM open_slots WHERE date IN (OLD.date, NEW.date);
+  INSERT INTO open_slots (date, speaker, title)
+  SELECT date, speaker, title FROM events AS main
+  WHERE date IN (OLD.date, NEW.date) AND warmup=0 AND NOT EXISTS (SELECT 1 FROM events AS w WHERE w.date=main.date AND w.warmup!=0);
+END;
+
+CREATE TRIGGER open_slots_delete AFTER DELETE ON events
+BEGIN
+  DELETE FROM open_slots WHERE date=OLD.date;
+  INSERT INTO open_slots (date, speaker, title)
+  SELECT date, speaker, title FROM events AS main
+  WHERE date=OLD.date AND warmup=0 AND NOT EXISTS (SELECT 1 FROM events AS w WHERE w.date=main.date AND w.warmup!=0);
+END;
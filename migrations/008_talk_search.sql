@@ -0,0 +1,29 @@
+-- Full-text index over the talks for /past/search. It is an external content table over
+-- `events` keyed by rowid, kept in sync by the triggers below. A VACUUM can renumber the
+-- rowids of `events`, so run `INSERT INTO talks_fts(talks_fts) VALUES('rebuild')` after one.
+
+CREATE VIRTUAL TABLE talks_fts USING fts5
+(speaker, affiliation, title, abstract, bio,
+ content='events', content_rowid='rowid', tokenize='porter unicode61 remove_diacritics 1');
+
+INSERT INTO talks_fts(talks_fts) VALUES('rebuild');
+
+CREATE TRIGGER talks_fts_insert AFTER INSERT ON events
+BEGIN
+  INSERT INTO talks_fts(rowid, speaker, affiliation, title, abstract, bio)
+  VALUES (NEW.rowid, NEW.speaker, NEW.affiliation, NEW.title, NEW.abstract, NEW.bio);
+END;
+
+CREATE TRIGGER talks_fts_update AFTER UPDATE OF speaker, affiliation, title, abstract, bio ON events
+BEGIN
+  INSERT INTO talks_fts(talks_fts, rowid, speaker, affiliation, title, abstract, bio)
+  VALUES ('delete', OLD.rowid, OLD.speaker, OLD.affiliation, OLD.title, OLD.abstract, OLD.bio);
+  INSERT INTO talks_fts(rowid, speaker, affiliation, title, abstract, bio)
+  VALUES (NEW.rowid, NEW.speaker, NEW.affiliation, NEW.title, NEW.abstract, NEW.bio);
+END;
+
+CREATE TRIGGER talks_fts_delete AFTER DELETE ON events
+BEGIN
+  INSERT INTO talks_fts(talks_fts, rowid, speaker, affiliation, title, abstract, bio)
+  VALUES ('delete', OLD.rowid, OLD.speaker, OLD.affiliation, OLD.title, OLD.abstract, OLD.bio);
+END;
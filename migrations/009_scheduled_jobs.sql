@@ -0,0 +1,10 @@
+-- Last and next run of the background jobs, see `Scheduler`. `next_run` is NULL while a job has nothing due.
+
+CREATE TABLE scheduled_jobs
+(name TEXT PRIMARY KEY,
+ last_run TIMESTAMP,
+ last_duration REAL, -- seconds
+ last_error TEXT,
+ next_run TIMESTAMP,
+ runs INT NOT NULL DEFAULT 0
+);
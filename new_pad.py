@@ -1,6 +1,6 @@
 from briefings_server import *
 print("Started")
-etherpad = py_etherpad.EtherpadLiteClient(apiKey=conf("etherpad.apikey"),baseUrl=conf("etherpad.url")+'/api')
+etherpad = etherpad_client()
 print("Etherpad loaded")
 prefix = SEMINAR_SERIES 
 padid = (prefix+str(uuid.uuid4())).replace('-','')
@@ -0,0 +1,28 @@
+"""The server module loaded on a synthetic database, shared by the tests since it can only be imported once per process."""
+
+import atexit
+import os.path
+import shutil
+import sys
+import tempfile
+
+repo_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+sys.path.insert(0, repo_dir)
+sys.path.insert(0, os.path.join(repo_dir, 'benchmarks'))
+from synthetic import make_database
+
+CONFIG = os.path.join(repo_dir, 'example-container-compose', 'nonlocally', 'oqe', 'var', 'oqe_config.sqlite')
+
+def load():
+    """Import briefings_server on a new synthetic database, or return it if it already is."""
+    if 'briefings_server' in sys.modules:
+        return sys.modules['briefings_server']
+    folder = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, folder, ignore_errors=True)
+    make_database(folder, 'test', CONFIG)
+    argv, sys.argv = sys.argv, ['briefings_server.py', 'test', folder]
+    try:
+        import briefings_server
+    finally:
+        sys.argv = argv
+    return briefings_server
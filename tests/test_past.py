@@ -0,0 +1,38 @@
+"""Pagination of the past talks, run with `python -m unittest discover tests`."""
+
+import datetime
+import unittest
+
+import cherrypy
+
+from synthetic_server import load
+
+def setUpModule():
+    global b
+    b = load()
+
+class TestPastPage(unittest.TestCase):
+    def test_naive_cursor(self):
+        before = datetime.datetime.now() - datetime.timedelta(days=100)
+        records, next = b.Past.page(before.isoformat())
+        self.assertEqual(len(records), b.PAST_PAGE_SIZE)
+        self.assertTrue(all(r[0] < before for r in records))
+        self.assertLess(next, records[0][0])
+
+    def test_aware_cursor(self):
+        before = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=100)
+        records, next = b.Past.page(before.isoformat())
+        self.assertEqual(records, b.Past.page(before.astimezone().replace(tzinfo=None).isoformat())[0])
+        records, next = b.Past.page('2020-01-01T00:00:00Z')
+        self.assertTrue(all(r[0] < datetime.datetime(2020, 1, 2) for r in records))
+
+    def test_cursor_in_the_future(self):
+        self.assertEqual(b.Past.page('2999-01-01T00:00:00+05:00'), b.Past.page(None))
+
+    def test_bad_cursor(self):
+        with self.assertRaises(cherrypy.HTTPError) as e:
+            b.Past.page('yesterday')
+        self.assertEqual(e.exception.status, 400)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+"""No query of the hot handlers and scheduled jobs falls back to a full table scan, checked with EXPLAIN QUERY PLAN."""
+
+import unittest
+
+from synthetic_server import load
+
+def is_full_scan(detail, partial_indexes):
+    return (detail.startswith('SCAN ') and not detail.startswith('SCAN CONSTANT ROW')
+            and 'VIRTUAL TABLE INDEX' not in detail # full-text queries are answered by the FTS5 index
+            and not any(detail.endswith(' INDEX '+name) for name in partial_indexes)) # only holds the rows still to be processed
+
+def setUpModule():
+    global b, date, invite, application, partial_indexes
+    b = load()
+    with b.conn() as c:
+        partial_indexes = [name for name, in c.execute("SELECT name FROM sqlite_master WHERE type='index' AND sql LIKE '% WHERE %'")]
+        date, = c.execute('SELECT date FROM events WHERE warmup=0 ORDER BY date DESC LIMIT 1 OFFSET 20').fetchone()
+        invite, = c.execute('SELECT uuid FROM invitations WHERE confirmed_date IS NOT NULL LIMIT 1').fetchone()
+        application, = c.execute('SELECT uuid FROM applications LIMIT 1').fetchone()
+
+class TestQueryPlans(unittest.TestCase):
+    def assertNoFullScans(self, f):
+        """Run `f` and check the plan of every query it made."""
+        statements = []
+        for d in [False, True]:
+            b.conn(d).set_trace_callback(statements.append)
+        try:
+            f()
+        finally:
+            for d in [False, True]:
+                b.conn(d).set_trace_callback(None)
+        c = b.conn()
+        checked = 0
+        for sql in statements:
+            sql = sql.strip()
+            if not sql.upper().startswith(('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT')) or "'main'." in sql: # FTS5 reading its own shadow tables
+                continue
+            if sql.upper().startswith('INSERT') and 'SELECT' not in sql.upper():
+                continue
+            plan = [detail for (_, _, _, detail) in c.execute('EXPLAIN QUERY PLAN '+sql, [None]*sql.count('?'))]
+            with self.subTest(sql=' '.join(sql.split())[:100]):
+                self.assertEqual([detail for detail in plan if is_full_scan(detail, partial_indexes)], [], plan)
+            checked += 1
+        self.assertGreater(checked, 0)
+
+    def test_public_pages(self):
+        self.assertNoFullScans(lambda: b.Root().index())
+        self.assertNoFullScans(lambda: b.Root().iframeupcoming())
+        self.assertNoFullScans(lambda: b.Past().index())
+        self.assertNoFullScans(lambda: b.Past.search_page('quantum network', 1))
+        self.assertNoFullScans(lambda: b.Event().index(str(date), '0'))
+        self.assertNoFullScans(lambda: b.Invite().index(invite))
+        self.assertNoFullScans(lambda: b.Apply().index())
+
+    def test_admin_pages(self):
+        self.assertNoFullScans(lambda: b.Admin().invite())
+        self.assertNoFullScans(lambda: b.Admin().invitestatus(status='pending'))
+        self.assertNoFullScans(lambda: b.Admin().eventstatus())
+        self.assertNoFullScans(lambda: b.Admin().applicationsstatus())
+        self.assertNoFullScans(lambda: b.Admin().judge(application))
+
+    def test_scheduled_jobs(self):
+        self.assertNoFullScans(b.check_upcoming_talks_and_email)
+        self.assertNoFullScans(b.check_recordings_and_download)
+        self.assertNoFullScans(b.expire_invitations)
+
+    def test_scheduler_due_times(self):
+        self.assertNoFullScans(b.announcements_due)
+        self.assertNoFullScans(b.recordings_due)
+        self.assertNoFullScans(b.invitations_due)
+
+if __name__ == '__main__':
+    unittest.main()
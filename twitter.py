@@ -1,6 +1,9 @@
 from requests_oauthlib import OAuth1Session
 import json
 
+TWITTER_API_URL = "https://api.twitter.com"
+TWITTER_UPLOAD_URL = "https://upload.twitter.com"
+
 # HOW TO SET UP TWITTER:
 # option 1 (web UI):
 #     go to /admin/authtwitter and follow the instructions
@@ -21,7 +24,7 @@ def twitter_login():
     consumer_secret = input("Paste the Consumer Secret here: ")
    
     # use the consumer key/secret to retrieve resource owner key/secret
-    request_token_url = "https://api.twitter.com/oauth/request_token?oauth_callback=oob&x_auth_access_type=write"
+    request_token_url = TWITTER_API_URL+"/oauth/request_token?oauth_callback=oob&x_auth_access_type=write"
     oauth = OAuth1Session(consumer_key, client_secret=consumer_secret)
     try:
         fetch_response = oauth.fetch_request_token(request_token_url)
@@ -35,13 +38,13 @@ def twitter_login():
 
     # use the resource owner key/secret to retrieve the access token/secret
     # Get authorization
-    base_authorization_url = "https://api.twitter.com/oauth/authorize"
+    base_authorization_url = TWITTER_API_URL+"/oauth/authorize"
     authorization_url = oauth.authorization_url(base_authorization_url)
     print("Please go here and authorize: %s" % authorization_url)
     verifier = input("Paste the PIN here: ")
 
     # Get the access token
-    access_token_url = "https://api.twitter.com/oauth/access_token"
+    access_token_url = TWITTER_API_URL+"/oauth/access_token"
     oauth = OAuth1Session(
         consumer_key,
         client_secret=consumer_secret,
@@ -70,9 +73,12 @@ def twitter_login():
 class Twitter:
     keytypes = ["consumer_key", "consumer_secret", "access_token", "access_secret", "resource_owner_key", "resource_owner_secret"]
 
-    def __init__(self, keys):
+    def __init__(self, keys, api_url=TWITTER_API_URL, upload_url=TWITTER_UPLOAD_URL):
         # Inputs:
         # keys: a dictionary with entries for the needed keys/secrets
+        # api_url, upload_url: where the API lives, e.g. a local stand-in for testing
+        self.api_url = api_url
+        self.upload_url = upload_url
         for keytype in Twitter.keytypes:
             try:
                 if keys[keytype].lower() in ['',"none","nil","null"]:
@@ -104,13 +110,13 @@ class Twitter:
 
         if self.access_token is None or self.access_secret is None:
             if "verifier_number" not in extradata or self.resource_owner_key is None or self.resource_owner_secret is None:
-                request_token_url = "https://api.twitter.com/oauth/request_token?oauth_callback=oob&x_auth_access_type=write"
+                request_token_url = self.api_url+"/oauth/request_token?oauth_callback=oob&x_auth_access_type=write"
                 oauth = OAuth1Session(self.consumer_key, client_secret=self.consumer_secret)
                 fetch_response = oauth.fetch_request_token(request_token_url)
                 resource_owner_key = fetch_response.get("oauth_token")
                 resource_owner_secret = fetch_response.get("oauth_token_secret")
 
-                base_authorization_url = "https://api.twitter.com/oauth/authorize"
+                base_authorization_url = self.api_url+"/oauth/authorize"
 
                 queries = [
                         {"save_key" : "resource_owner_key", "save_value" : resource_owner_key},
@@ -119,7 +125,7 @@ class Twitter:
                         ]
                 return queries
             else:
-                access_token_url = "https://api.twitter.com/oauth/access_token"
+                access_token_url = self.api_url+"/oauth/access_token"
                 oauth = OAuth1Session(
                     self.consumer_key,
                     client_secret=self.consumer_secret,
@@ -172,7 +178,7 @@ class Twitter:
                 resource_owner_secret=self.access_secret,
             )
 
-            response = oauth.post('https://upload.twitter.com/1.1/media/upload.json', json=request_data, files=files)
+            response = oauth.post(self.upload_url+'/1.1/media/upload.json', json=request_data, files=files)
             media_id = None
             if not response.ok:
                 logtext = f"twitter media upload failed due to response {response.status_code} : {response.text}"
@@ -215,7 +221,7 @@ class Twitter:
                 payload["media"] = {"media_ids" : [media_id]}
 
             response = oauth.post(
-                "https://api.twitter.com/2/tweets",
+                self.api_url+"/2/tweets",
                 json=payload,
             )
 